@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*-coding:utf-8 -*-
+
+'''
+Benchmarks of the interface lattice-matching pipeline in masgent.utils.interface_maker.
+
+Synthetic cubic, hexagonal and low-symmetry bulk cells are matched over a sweep of max_area, tolerances and Miller indices, and screened over a sweep of Miller index maxima.
+Wall time, peak memory and candidate counts of every stage are written as JSON, so that runs can be compared over time.
+
+Usage:
+    python benchmarks/bench_interface_maker.py --output bench_interface_maker.json
+    python benchmarks/bench_interface_maker.py --quick
+'''
+
+import os
+import sys
+import json
+import shutil
+import time
+import argparse
+import platform
+import tempfile
+import datetime
+import tracemalloc
+import numpy as np
+import ase
+from ase import Atoms
+from ase.io import write
+from ase.build import bulk
+
+from masgent.utils import interface_maker as im
+
+# Synthetic bulk cells, a low-symmetry triclinic cell is built by hand
+def make_bulks():
+    triclinic = Atoms(
+        'NaCl',
+        scaled_positions=[[0.0, 0.0, 0.0], [0.47, 0.52, 0.49]],
+        cell=[[4.1, 0.0, 0.0], [0.7, 4.6, 0.0], [0.5, 0.9, 5.3]],
+        pbc=True,
+        )
+    return {
+        'cubic_Cu': bulk('Cu', 'fcc', a=3.615, cubic=True),
+        'cubic_MgO': bulk('MgO', 'rocksalt', a=4.212, cubic=True),
+        'hexagonal_Ti': bulk('Ti', 'hcp', a=2.951, c=4.686),
+        'triclinic_NaCl': triclinic,
+        }
+
+# Interface cases as (lower, upper, lower hkl, upper hkl)
+CASES = [
+    ('cubic_Cu', 'cubic_MgO', (1, 0, 0), (1, 0, 0)),
+    ('cubic_Cu', 'hexagonal_Ti', (1, 1, 1), (0, 0, 1)),
+    ('hexagonal_Ti', 'triclinic_NaCl', (1, 0, 0), (1, 1, 0)),
+    ('triclinic_NaCl', 'cubic_MgO', (1, 0, 1), (1, 1, 0)),
+    ]
+
+def measure(func, *args, repeat=1, **kwargs):
+    # Best wall time of the repeats without tracing, then the peak memory of one traced call
+    wall_times = []
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        wall_times.append(time.perf_counter() - start)
+
+    clear_caches()
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {'wall_time': min(wall_times), 'peak_memory': peak}
+
+def clear_caches():
+    # Every measurement starts cold, the caches would otherwise hide the cost of the stages
+    im.cal_uv_cached.cache_clear()
+    im.load_slab.cache_clear()
+    im.load_bulk.cache_clear()
+
+def bench_reduce(sizes, repeat, rng):
+    results = []
+    for size in sizes:
+        bases = rng.normal(size=(size, 2, 2)) * rng.uniform(1, 20, size=(size, 1, 1))
+        _, stats = measure(lambda: [im.reduce(a, b) for a, b in bases], repeat=repeat)
+        results.append({'stage': 'reduce', 'size': size, 'count': size, **stats})
+        _, stats = measure(im.reduce_batch, bases, repeat=repeat)
+        results.append({'stage': 'reduce_batch', 'size': size, 'count': size, **stats})
+    return results
+
+def bench_trim(sizes, repeat, rng):
+    # Tables with about half of the rows duplicated within the allclose tolerance
+    results = []
+    for size in sizes:
+        data = rng.uniform(1, 100, size=(size // 2, 12))
+        data = np.concatenate([data, data[rng.integers(0, len(data), size - len(data))] * (1 + 1e-9)])
+        (data_trimmed, same_idx), stats = measure(im.trim, data, repeat=repeat)
+        results.append({'stage': 'trim', 'size': size, 'count': len(data_trimmed), 'removed': len(same_idx), **stats})
+    return results
+
+def bench_find_int(max_areas, repeat, rng):
+    results = []
+    ratios = rng.uniform(0.2, 5.0, size=50)
+    for max_area in max_areas:
+        for area_tol in (None, 5.0):
+            int_lists, stats = measure(lambda: [im.find_int(10.0, 10.0 * ratio, max_area, area_tol)[0] for ratio in ratios], repeat=repeat)
+            results.append({'stage': 'find_int', 'max_area': max_area, 'area_tol': area_tol, 'count': sum(len(i) for i in int_lists), **stats})
+    return results
+
+def bench_cal_uv(n_values, repeat):
+    results = []
+    a, b = (3.6, 0.0), (1.2, 3.4)
+    for n in n_values:
+        data, stats = measure(im.cal_uv_cached, a, b, n, repeat=repeat)
+        results.append({'stage': 'cal_uv', 'n': n, 'count': len(data), 'removed': len(im.find_ijm(n)) - len(data), **stats})
+    return results
+
+def bench_pipeline(paths, max_areas, uv_tols, angle_tols, n_interfaces, repeat, work_dir):
+    results = []
+    for lower, upper, lower_hkl, upper_hkl in CASES:
+        for max_area in max_areas:
+            for uv_tol in uv_tols:
+                for angle_tol in angle_tols:
+                    case = {'lower': lower, 'upper': upper, 'lower_hkl': lower_hkl, 'upper_hkl': upper_hkl, 'max_area': max_area, 'uv_tol': uv_tol, 'angle_tol': angle_tol}
+                    output_dir = os.path.join(work_dir, f'{lower}_{upper}_{max_area}_{uv_tol}_{angle_tol}')
+                    maker = im.InterfaceMaker(
+                        paths[lower],
+                        paths[upper],
+                        output_dir,
+                        lower_hkl=list(lower_hkl),
+                        upper_hkl=list(upper_hkl),
+                        min_area=1.0,
+                        max_area=max_area,
+                        uv_tol=uv_tol,
+                        angle_tol=angle_tol,
+                        write_slabs=False,
+                        reuse_matches=False,
+                        )
+
+                    (data_lower, slabs_lower), stats = measure(maker.slab_maker, paths[lower], [lower_hkl], maker.slab_vacuum, maker.lower_slab_layers, repeat=repeat)
+                    results.append({'stage': 'slab_maker', **case, 'count': len(data_lower), **stats})
+                    data_upper, slabs_upper = maker.slab_maker(paths[upper], [upper_hkl], maker.slab_vacuum, maker.upper_slab_layers)
+
+                    data_pairs, stats = measure(im.pair_slabs, data_lower, data_upper, max_area, repeat=repeat)
+                    results.append({'stage': 'pair_slabs', **case, 'count': sum(len(row[5]) for row in data_pairs), **stats})
+
+                    data_matched, stats = measure(maker.lattice_match, data_pairs, data_lower, data_upper, repeat=repeat)
+                    results.append({'stage': 'lattice_match', **case, 'count': len(data_matched), **stats})
+
+                    if len(data_matched) == 0:
+                        continue
+
+                    # Build and write the interfaces of the first candidates
+                    maker.slabs_lower, maker.slabs_upper = slabs_lower, slabs_upper
+                    hkl = np.array([(data_lower[0][0], data_upper[0][0])] * len(data_matched), dtype='U16')
+                    n_atoms_lower = {key: len(slab) for key, slab in slabs_lower.items()}
+                    n_atoms_upper = {key: len(slab) for key, slab in slabs_upper.items()}
+                    candidates = im.make_candidates(hkl, data_matched, n_atoms_lower, n_atoms_upper)
+
+                    def gen_intfs():
+                        shutil.rmtree(f'{output_dir}/interfaces', ignore_errors=True)
+                        os.makedirs(f'{output_dir}/interfaces')
+                        for i, slabs, interfaces in maker.iter_interfaces(candidates, top_k=n_interfaces):
+                            maker.gen_intf(i, candidates[i], slabs, interfaces)
+
+                    _, stats = measure(gen_intfs, repeat=repeat)
+                    results.append({'stage': 'gen_intf', **case, 'count': min(n_interfaces, len(candidates)), **stats})
+    return results
+
+def bench_screen(paths, hkl_maxes, max_area, repeat, work_dir):
+    # Sweep the Miller index maxima of both materials and count the hkl pairs left after every stage
+    results = []
+    for lower, upper in dict.fromkeys((lower, upper) for lower, upper, _, _ in CASES):
+        for hkl_max in hkl_maxes:
+            case = {'lower': lower, 'upper': upper, 'hkl_max': hkl_max, 'max_area': max_area}
+
+            (lower_hkls, upper_hkls), stats = measure(lambda: (im.find_hkl(*hkl_max), im.find_hkl(*hkl_max)), repeat=repeat)
+            results.append({'stage': 'find_hkl', **case, 'count': len(lower_hkls) + len(upper_hkls), 'pairs': len(lower_hkls) * len(upper_hkls), **stats})
+
+            (lower_hkls, upper_hkls), stats = measure(lambda: (im.find_hkl_unique(paths[lower], *hkl_max), im.find_hkl_unique(paths[upper], *hkl_max)), repeat=repeat)
+            results.append({'stage': 'find_hkl_unique', **case, 'count': len(lower_hkls) + len(upper_hkls), 'pairs': len(lower_hkls) * len(upper_hkls), **stats})
+
+            # Serial screening, the identical slabs are trimmed before the pairs are matched
+            for symmetry_reduce in (False, True):
+                output_dir = os.path.join(work_dir, f'screen_{lower}_{upper}_{"".join(map(str, hkl_max))}_{symmetry_reduce}')
+                maker = im.InterfaceMaker(paths[lower], paths[upper], output_dir, min_area=1.0, max_area=max_area, reuse_matches=False)
+                matched, stats = measure(maker.screen, hkl_max, hkl_max, n_workers=1, symmetry_reduce=symmetry_reduce, repeat=repeat)
+                with open(f'{output_dir}/interface_screening.csv') as f:
+                    n_pairs = sum(1 for _ in f) - 1
+                results.append({'stage': 'screen', **case, 'symmetry_reduce': symmetry_reduce, 'count': len(matched), 'pairs': n_pairs, **stats})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the interface lattice-matching pipeline')
+    parser.add_argument('--output', default='bench_interface_maker.json', help='Path of the JSON results file')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed repeats, the best one is recorded')
+    parser.add_argument('--quick', action='store_true', help='Run a small sweep for a quick check')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic inputs')
+    args = parser.parse_args()
+
+    if args.quick:
+        sizes, max_areas, uv_tols, angle_tols, n_values, n_interfaces = [100, 1000], [100.0, 300.0], [5.0], [5.0], [4, 16], 2
+        hkl_maxes = [(1, 1, 1), (2, 2, 2)]
+    else:
+        sizes, max_areas, uv_tols, angle_tols, n_values, n_interfaces = [100, 1000, 10000], [100.0, 300.0, 600.0], [2.0, 5.0], [2.0, 5.0], [4, 16, 64], 5
+        hkl_maxes = [(1, 1, 1), (2, 2, 2), (3, 3, 3)]
+    rng = np.random.default_rng(args.seed)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = {}
+        for name, atoms in make_bulks().items():
+            paths[name] = os.path.join(work_dir, f'{name}.vasp')
+            write(paths[name], atoms, format='vasp', direct=True)
+
+        results.extend(bench_reduce(sizes, args.repeat, rng))
+        results.extend(bench_trim(sizes, args.repeat, rng))
+        results.extend(bench_find_int(max_areas, args.repeat, rng))
+        results.extend(bench_cal_uv(n_values, args.repeat))
+        results.extend(bench_pipeline(paths, max_areas, uv_tols, angle_tols, n_interfaces, args.repeat, work_dir))
+        results.extend(bench_screen(paths, hkl_maxes, max_areas[0], args.repeat, work_dir))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'ase': ase.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'quick': args.quick,
+            },
+        'results': results,
+        }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+
+    for row in results:
+        params = ', '.join(f'{key}={value}' for key, value in row.items() if key not in ('stage', 'wall_time', 'peak_memory', 'count'))
+        print(f'{row["stage"]:<15}{row["wall_time"] * 1000:>12.3f} ms{row["peak_memory"] / 1024:>12.1f} KiB{row["count"]:>10}  {params}')
+    print(f'\nResults written to {args.output}')
+
+if __name__ == '__main__':
+    main()
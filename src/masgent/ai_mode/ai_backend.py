@@ -242,6 +242,7 @@ def main():
             tools.generate_sqs_from_poscar,
             tools.generate_surface_slab_from_poscar,
             tools.generate_interface_from_poscars,
+            tools.screen_interfaces_from_poscars,
             tools.visualize_structure_from_poscar,
             tools.generate_vasp_workflow_of_convergence_tests,
             tools.generate_vasp_workflow_of_eos,
@@ -253,6 +254,7 @@ def main():
             tools.analyze_vasp_workflow_of_elastic_constants,
             tools.analyze_vasp_workflow_of_aimd,
             tools.run_simulation_using_mlps,
+            tools.screen_structures_using_mlps,
             tools.analyze_features_for_machine_learning,
             tools.reduce_dimensions_for_machine_learning,
             tools.augment_data_for_machine_learning,
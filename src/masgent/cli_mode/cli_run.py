@@ -1713,6 +1713,26 @@ def call_mlps(mlps_type: str):
         time.sleep(1)
         return
 
+    try:
+        while True:
+            perf_profile_str = color_input('\nEnter the CPU performance profile (default, fast, accurate), or press Enter to skip: ', 'yellow').strip().lower()
+
+            if not perf_profile_str:
+                perf_profile = None
+                break
+
+            try:
+                schemas.RunSimulationUsingMlps(poscar_path=poscar_path, perf_profile=perf_profile_str)
+                perf_profile = perf_profile_str
+                break
+            except Exception:
+                color_print(f'[Error] Invalid performance profile: {perf_profile_str}, please double check and try again.\n', 'red')
+
+    except (KeyboardInterrupt, EOFError):
+        color_print('\n[Error] Input cancelled. Returning to previous menu...\n', 'red')
+        time.sleep(1)
+        return
+
     if task_type in ['single', 'eos', 'elastic']:
         try:
             while True:
@@ -1776,7 +1796,7 @@ def call_mlps(mlps_type: str):
 
         print('')
         with yaspin(Spinners.dots, text=f'Running simulation using {mlps_type}... See details in the log file. ', color='cyan') as sp:
-            result = tools.run_simulation_using_mlps(poscar_path=poscar_path, mlps_type=mlps_type, task_type=task_type, fmax=fmax, max_steps=max_steps, scale_factors=scale_factors if task_type=='eos' else [0.94, 0.96, 0.98, 1.00, 1.02, 1.04, 1.06])
+            result = tools.run_simulation_using_mlps(poscar_path=poscar_path, mlps_type=mlps_type, task_type=task_type, fmax=fmax, max_steps=max_steps, scale_factors=scale_factors if task_type=='eos' else [0.94, 0.96, 0.98, 1.00, 1.02, 1.04, 1.06], perf_profile=perf_profile)
         color_print(result['message'], 'green')
         time.sleep(3)
     
@@ -1843,7 +1863,7 @@ def call_mlps(mlps_type: str):
 
         print('')
         with yaspin(Spinners.dots, text=f'Running simulation using {mlps_type}... See details in the log file. ', color='cyan') as sp:
-            result = tools.run_simulation_using_mlps(poscar_path=poscar_path, mlps_type=mlps_type, task_type=task_type, temperature=temperature, md_steps=md_steps, md_timestep=md_timestep)
+            result = tools.run_simulation_using_mlps(poscar_path=poscar_path, mlps_type=mlps_type, task_type=task_type, temperature=temperature, md_steps=md_steps, md_timestep=md_timestep, perf_profile=perf_profile)
         color_print(result['message'], 'green')
         time.sleep(3)
 
@@ -1,70 +1,154 @@
 
 import os
 import shutil
+import hashlib
+import tempfile
+import multiprocessing
 import numpy as np
 from itertools import product
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from ase import Atoms, __version__ as ase_version
 from ase.io import read, write
 from ase.build import surface, make_supercell
 
-def reduce(a, b):
-    a_list, b_list = [a], [b]
-    T_list = [np.array([[1, 0], [0, 1]])]
-    while True:
-        if np.dot(a, b) < 0:
-            b = -b
-            a_list.append(a)
-            b_list.append(b)
-            T_ = np.array([[1, 0], [0, -1]])
-            T = np.dot(T_, T_list[-1])
-            T_list.append(T)
-
-        if np.linalg.norm(a) > np.linalg.norm(b):
-            a, b = b, a
-            a_list.append(a)
-            b_list.append(b)
-            T_ = np.array([[0, 1], [1, 0]])
-            T = np.dot(T_, T_list[-1])
-            T_list.append(T)
-            continue
-
-        if np.linalg.norm(b) > np.linalg.norm(b + a):
-            b = b + a
-            a_list.append(a)
-            b_list.append(b)
-            T_ = np.array([[1, 0], [1, 1]])
-            T = np.dot(T_, T_list[-1])
-            T_list.append(T)
-            continue
+# Maximum number of (slab basis, hkl, n) supercell tables kept by cal_uv
+UV_CACHE_SIZE = 512
+
+# Maximum number of bulk structures and slabs kept in memory by load_bulk and load_slab
+BULK_CACHE_SIZE = 32
+SLAB_CACHE_SIZE = 256
+
+# Number of float columns in a matched row of lattice_match
+MATCH_COLUMNS = 19
+
+# Unfiltered lattice matches of the last run, written next to interface_maker.csv
+MATCHES_FILE = 'interface_matches.npz'
+
+# Fewest Miller index pairs per screening worker, a pair is searched in milliseconds while spawning a worker takes about a second
+SCREEN_JOBS_PER_WORKER = 500
+
+# InterfaceMaker of a screening worker, sent once by the pool initializer
+_screen_maker = None
+
+# Multi-frame files of the extxyz output mode, four interface frames and two slab frames per interface
+INTERFACES_ARCHIVE = 'interfaces.extxyz'
+SLABS_ARCHIVE = 'interface_slabs.extxyz'
+
+# Typed candidate table returned by InterfaceMaker.search, one row per matched supercell pair
+CANDIDATE_DTYPE = np.dtype([
+    ('hkl_0', 'U16'),
+    ('hkl_1', 'U16'),
+    ('u_mis', float),
+    ('v_mis', float),
+    ('angle_mis', float),
+    ('area_0', float),
+    ('area_1', float),
+    ('area_mis', float),
+    ('T_0', float, (2, 2)),
+    ('T_1', float, (2, 2)),
+    ('uv_0', float, (3,)),
+    ('uv_1', float, (3,)),
+    ('n_atoms', int),
+    ])
+
+# Sort keys of the candidate metrics, the first key is the primary one
+CANDIDATE_METRICS = {
+    'area': ('area_0', 'uv_mis'),
+    'misfit': ('uv_mis', 'area_0'),
+    'angle': ('angle_mis', 'uv_mis'),
+    'area_mis': ('area_mis', 'uv_mis'),
+    'n_atoms': ('n_atoms', 'uv_mis'),
+    }
+
+def row_dot(x, y):
+    # Row-wise dot products of (N, 2) arrays, evaluated like np.dot on each row
+    return (x[:, None, :] @ y[:, :, None])[:, 0, 0]
+
+def row_norm(x):
+    return np.sqrt(row_dot(x, x))
+
+def reduce_batch(bases):
+    # Reduce a batch of 2D cell bases with shape (N, 2, 2) simultaneously
+    # Returns the reduced bases and the transformation matrices, reduced = T @ bases
+    bases = np.array(bases, dtype=float).reshape(-1, 2, 2)
+    a, b = bases[:, 0].copy(), bases[:, 1].copy()
+    T = np.tile(np.eye(2, dtype=int), (len(bases), 1, 1))
+
+    # Transformation matrices for each reduction step
+    T_flip = np.array([[1, 0], [0, -1]])
+    T_swap = np.array([[0, 1], [1, 0]])
+    T_add = np.array([[1, 0], [1, 1]])
+    T_sub = np.array([[1, 0], [-1, 1]])
+
+    active = np.arange(len(bases))
+    while len(active) > 0:
+        a_, b_, T_ = a[active], b[active], T[active]
+
+        # Flip b if the angle between a and b is obtuse
+        flip = row_dot(a_, b_) < 0
+        b_[flip] = -b_[flip]
+        T_[flip] = T_flip @ T_[flip]
+
+        # Only one of swap, add and subtract is applied per iteration, in this order
+        norm_a = row_norm(a_)
+        norm_b = row_norm(b_)
+        swap = norm_a > norm_b
+        add = ~swap & (norm_b > row_norm(b_ + a_))
+        sub = ~swap & ~add & (norm_b > row_norm(b_ - a_))
+
+        a_[swap], b_[swap] = b_[swap], a_[swap].copy()
+        T_[swap] = T_swap @ T_[swap]
+        b_[add] = b_[add] + a_[add]
+        T_[add] = T_add @ T_[add]
+        b_[sub] = b_[sub] - a_[sub]
+        T_[sub] = T_sub @ T_[sub]
+
+        a[active], b[active], T[active] = a_, b_, T_
+
+        # Keep iterating only the bases that changed in this iteration
+        active = active[swap | add | sub]
+
+    return np.stack([a, b], axis=1), T
 
-        if np.linalg.norm(b) > np.linalg.norm(b - a):
-            b = b - a
-            a_list.append(a)
-            b_list.append(b)
-            T_ = np.array([[1, 0], [-1, 1]])
-            T = np.dot(T_, T_list[-1])
-            T_list.append(T)
-            continue
-
-        break
-
-    return a_list, b_list, T_list
+def reduce(a, b):
+    reduced, T = reduce_batch([a, b])
+    return reduced[0, 0], reduced[0, 1], T[0]
 
 
-def find_int(area_0, area_1, area):
+def find_int(area_0, area_1, area, area_tol=None):
     ratio = area_0 / area_1
     N_0 = int(area / area_1) + 1
     N_1 = int(area / area_0) + 1
 
+    # List all the integers within the area misfit tolerance (%) instead of only the improving ones
+    if area_tol is not None:
+        return find_int_within(ratio, N_0, N_1, area_tol), ratio
+
     # Initialize the variables
     n_0 = 1
     n_1 = 1
     min_diff = abs(ratio - n_0 / n_1)
 
-    # Loop over all the possible integers and store all the possible i, j
+    # Store the integers that improve the ratio in the order of a full n_0, n_1 double loop.
+    # For a fixed n_0, abs(ratio - n_0 / n_1) decreases while n_0 / n_1 >= ratio and increases afterwards,
+    # so only the decreasing run below the current best and the first n_1 past the ratio can improve it.
     int_list = [[1, 1, 1]]
-    
+
     for n_0 in range(1, N_0):
-        for n_1 in range(1, N_1):
+        # Last n_1 with n_0 / n_1 >= ratio
+        n_hi = min(int(n_0 / ratio), N_1 - 1)
+        while n_hi < N_1 - 1 and n_0 / (n_hi + 1) >= ratio:
+            n_hi += 1
+        while n_hi >= 1 and n_0 / n_hi < ratio:
+            n_hi -= 1
+
+        # First n_1 of the decreasing run that can beat the current best
+        n_lo = min(max(int(n_0 / (ratio + min_diff)), 1), max(n_hi, 1))
+        while n_lo > 1 and abs(ratio - n_0 / (n_lo - 1)) < min_diff:
+            n_lo -= 1
+
+        for n_1 in range(n_lo, min(n_hi + 2, N_1)):
             diff = abs(ratio - n_0 / n_1)
             if diff < min_diff:
                 min_diff = diff
@@ -72,6 +156,20 @@ def find_int(area_0, area_1, area):
 
     return int_list, ratio
 
+def find_int_within(ratio, N_0, N_1, area_tol):
+    # Area misfit of the supercells n_1 * area_0 and n_0 * area_1 is abs(ratio - n_0 / n_1) / ratio
+    tol = area_tol / 100
+    int_list = []
+    for n_0 in range(1, N_0):
+        # Range of n_1 around n_0 / ratio, slightly widened and checked exactly below
+        n_1_min = max(int(n_0 / (ratio * (1 + tol))) - 1, 1)
+        n_1_max = N_1 - 1 if tol >= 1 else min(int(n_0 / (ratio * (1 - tol))) + 1, N_1 - 1)
+        for n_1 in range(n_1_min, n_1_max + 1):
+            if abs(ratio - n_0 / n_1) / ratio <= tol:
+                int_list.append([n_0, n_1, n_0 / n_1])
+
+    return int_list
+
 def find_ijm(N):
     ijm_list = []
     for i in range(1, N + 1):
@@ -88,199 +186,34 @@ def cal_mis(u_length_0, v_length_0, uv_angle_0, u_length_1, v_length_1, uv_angle
 
     return u_mis, v_mis, angle_mis
 
-def gen_intf(i, profile):
-    hkl_0, hkl_1 = profile[0], profile[1]
-    T_0 = np.array(profile[7:11]).reshape(2, 2)
-    T_1 = np.array(profile[11:15]).reshape(2, 2)
-    
-    # Transform the 2x2 T matrix to 3x3 T matrix
-    T_0 = np.vstack([T_0, [0, 0]])
-    T_0 = np.hstack([T_0, [[0], [0], [1]]])
-    T_1 = np.vstack([T_1, [0, 0]])
-    T_1 = np.hstack([T_1, [[0], [0], [1]]])
-
-    # Read the slab data
-    cell_name_0 = f'{LOWER_CONV.split("/")[-1].split(".")[0]}'
-    cell_name_1 = f'{UPPER_CONV.split("/")[-1].split(".")[0]}'
-    slab_0 = read(f'{OUTPUT_DIR}/slabs/slab_{hkl_0}_{cell_name_0}.vasp')
-    slab_1 = read(f'{OUTPUT_DIR}/slabs/slab_{hkl_1}_{cell_name_1}.vasp')
-
-    # Transform the slab data
-    slab_0 = make_supercell(slab_0, T_0, order='atom-major')
-    slab_1 = make_supercell(slab_1, T_1, order='atom-major')
-
-    # Create slab_0_reverse and slab_1_reverse for the reversed z-axis
-    slab_0_reverse = slab_0.copy()
-    slab_1_reverse = slab_1.copy()
-    slab_0_reverse.positions[:, 2] = slab_0.cell[2, 2] - slab_0.positions[:, 2]
-    slab_1_reverse.positions[:, 2] = slab_1.cell[2, 2] - slab_1.positions[:, 2]
-
-    # Write the transformed slab data
-    save_path = f'{OUTPUT_DIR}/interfaces/intf_{i+1}_slabs'
-    os.makedirs(save_path)
-    write(f'{save_path}/intf_{i+1}_slab_0_{hkl_0}.vasp', slab_0, format='vasp', direct=True, sort=True)
-    write(f'{save_path}/intf_{i+1}_slab_1_{hkl_1}.vasp', slab_1, format='vasp', direct=True, sort=True)
-
-    comb = [(slab_0, slab_1), (slab_0_reverse, slab_1), (slab_0, slab_1_reverse), (slab_0_reverse, slab_1_reverse)]
-    for j, (slab_0, slab_1) in enumerate(comb):
-
-        # Compare the areas of slab_0 and slab_1, let slab_0 be the lower slab with the larger area
-        area_0, area_1 = profile[5], profile[6]
-        reversed = False
-        if area_0 < area_1:
-            slab_0, slab_1 = slab_1, slab_0
-            reversed = True
-
-        # Get the thickness of slab_0, slab_1, and interface
-        z_top_0 = max([atom.position[2] for atom in slab_0])
-        z_bottom_0 = min([atom.position[2] for atom in slab_0])
-        z_top_1 = max([atom.position[2] for atom in slab_1])
-        z_bottom_1 = min([atom.position[2] for atom in slab_1])
-        slab_0_thickness = z_top_0 - z_bottom_0
-        slab_1_thickness = z_top_1 - z_bottom_1
-        interface_thickness = slab_0_thickness + slab_1_thickness + SLAB_VACUUM * 2 + INTERFACE_GAP
-
-        # Create the interface 
-        interface = slab_0.copy()
-        interface.set_cell([slab_0.cell[0], slab_0.cell[1], [0, 0, interface_thickness]])
-
-        # Reverse the z-axis
-        interface.positions[:, 2] = interface_thickness-interface.positions[:, 2]
-
-        # Get the global coordinates of the atoms in interface and slab_1
-        cell = interface.cell
-        slab_1_cell = slab_1.cell
-        
-        cell_ = cell.copy()
-        cell_[2] = slab_1_cell[2]
-        slab_1_positions = slab_1.positions
-
-        # Transform the slab_1 to the global coordinates of interface
-        slab_1_positions_frac = np.dot(np.linalg.inv(slab_1_cell.T), slab_1_positions.T).T
-        slab_1_positions_global = np.dot(cell_.T, slab_1_positions_frac.T).T
-        slab_1.cell = cell
-        slab_1.positions = slab_1_positions_global
-
-        # Shift the interface lower
-        z_bottom_interface = min([atom.position[2] for atom in interface])
-        z_disp_interface = z_bottom_interface - SLAB_VACUUM
-        interface.translate([0, 0, -z_disp_interface])
-
-        # Shift the slab_1 upper
-        z_top_slab_1 = max([atom.position[2] for atom in slab_1])
-        z_disp_slab_1 = interface_thickness - SLAB_VACUUM - z_top_slab_1
-        slab_1.translate([0, 0, z_disp_slab_1])
-
-        # Create the interface
-        interface.extend(slab_1)
-
-        # Reverse the z-axis if needed
-        if reversed:
-            interface.positions[:, 2] = interface_thickness-interface.positions[:, 2]
-        
-        # Write the interface
-        write(f'{OUTPUT_DIR}/interfaces/intf_{i+1}_{j+1}_{hkl_0}_{hkl_1}.vasp', interface, format='vasp', direct=True, sort=True)
-
-        # Store the lattice matching data
-        with open(f'{OUTPUT_DIR}/interface_maker.log', 'a') as f:
-            f.write(f' Interface {i+1}-{j+1} '.center(70, '-') + '\n')
-
-            f.write('Total atoms:'.ljust(50) + f'{len(interface)}\n')
-            f.write('Lower / Upper hkl:'.ljust(50) + f'({hkl_0}) / ({hkl_1})\n')
-            f.write('Lower / Upper area (A^2):'.ljust(50) + f'{area_0:.2f} / {area_1:.2f}\n')
-            f.write('\n')
-
-            f.write('U misfit (%):'.ljust(50) + f'{profile[2] * 100:.6f}\n')
-            f.write('V misfit (%):'.ljust(50) + f'{profile[3] * 100:.6f}\n')
-            f.write('Angle misfit (°):'.ljust(50) + f'{profile[4]:.6f}\n')
-            f.write('Area misfit (%):'.ljust(50) + f'{np.abs(area_0 - area_1) / area_0 * 100:.6f}\n')
-            f.write('\n')
-
-            f.write('Transformed matrix for lower slab:\n')
-            f.write(f'{T_0[0][0]:.6f}  {T_0[0][1]:.6f}\n')
-            f.write(f'{T_0[1][0]:.6f}  {T_0[1][1]:.6f}\n')
-            f.write('\n')
-
-            f.write('Transformed matrix for upper slab:\n')
-            f.write(f'{T_1[0][0]:.6f}  {T_1[0][1]:.6f}\n')
-            f.write(f'{T_1[1][0]:.6f}  {T_1[1][1]:.6f}\n')
-            f.write('\n')
-        
-        # Store the lattice matching data in a csv file
-        with open(f'{OUTPUT_DIR}/interface_maker.csv', 'a') as f:
-            f.write(f'{i+1},{j+1},{len(interface)},{str(hkl_0)},{str(hkl_1)},{area_0:.6f},{area_1:.6f},{profile[2]*100:.6f},{profile[3]*100:.6f},{profile[4]:.6f},{np.abs(area_0-area_1)/area_0*100:.6f},{T_0[0][0]:.6f},{T_0[0][1]:.6f},{T_0[1][0]:.6f},{T_0[1][1]:.6f},{T_1[0][0]:.6f},{T_1[0][1]:.6f},{T_1[1][0]:.6f},{T_1[1][1]:.6f}\n')
-
-def trim(data):
-    data = np.array(data)
+def trim(data, rtol=1e-5, atol=1e-8):
+    data = np.array(data, dtype=float)
     # Get the lattice parameters
     lattice_params = data[:, -3:]
 
-    # Compare lattice parameters and get the unique indices
-    same_idx = []
-    for i in range(len(lattice_params)):
-        for j in range(i+1, len(lattice_params)):
-            if np.allclose(lattice_params[i], lattice_params[j]):
-                same_idx.append(j)
-                
-    # Trim the data
+    # Row j is a duplicate if np.allclose(lattice_params[i], lattice_params[j]) holds for any earlier row i.
+    # Sort by the first lattice parameter so that only rows inside its tolerance window need to be compared.
+    key = lattice_params[:, 0]
+    order = np.argsort(key, kind='stable')
+    key_sorted = key[order]
+    margin = (atol + rtol * np.abs(key)) * (1 + 1e-9)
+    lo = np.searchsorted(key_sorted, key - margin, side='left')
+    hi = np.searchsorted(key_sorted, key + margin, side='right')
+    j, i = expand_windows(order, lo, hi)
+
+    # Compare the remaining candidate pairs with the same criterion as np.allclose
+    earlier = i < j
+    i, j = i[earlier], j[earlier]
+    close = np.all(np.abs(lattice_params[i] - lattice_params[j]) <= atol + rtol * np.abs(lattice_params[j]), axis=1)
+    same_idx = np.unique(j[close]).tolist()
+
+    # Trim the data, len(same_idx) is the number of removed duplicates
     data = np.delete(data, same_idx, axis=0)
     data = data.tolist()
 
     return data, same_idx
 
-def slab_maker(cell_conv, miller_indices, vacuum, layers):
-    cell_name = f'{cell_conv.split("/")[-1].split(".")[0]}'
-
-    data = []
-    slabs = []
-
-    for h, k, l in miller_indices:
-        atom = read(cell_conv)
-        slab = surface(lattice=atom, indices=(h, k, l), layers=layers, vacuum=vacuum, tol=1e-10, periodic=True)
-        
-        # Get cell parameters
-        cell = slab.cell
-        a, b = cell[0][:2], cell[1][:2]
-
-        a_ = np.array([cell[0][0], cell[0][1], 0.0])
-        b_ = np.array([cell[1][0], cell[1][1], 0.0])
-        S = np.linalg.norm(np.cross(a_, b_))
-
-        # Reduce the cell vectors
-        a_list, b_list, T_list = reduce(a, b)
-        a_r, b_r, T = a_list[-1], b_list[-1], T_list[-1]
-        a_length_r, b_length_r = np.linalg.norm(a_r), np.linalg.norm(b_r)
-        ab_angle_r = np.arccos(np.dot(a_r, b_r) / (a_length_r * b_length_r)) * 180 / np.pi
-        
-        # Store the slab data for each Miller index
-        data.append([h, k, l, S, *a, *b, a_length_r, b_length_r, ab_angle_r])
-        slabs.append(slab)
-
-    # Compare lattice parameters and delete the same ones
-    data, same_idx = trim(data)
-    
-    # Write the slabs
-    for i, slab in enumerate(slabs):
-        h, k, l = miller_indices[i]
-        if i not in same_idx:
-            write(f'{OUTPUT_DIR}/slabs/slab_{h}{k}{l}_{cell_name}.vasp', slab, format='vasp', direct=True, sort=True)
-
-    ''' Data format:
-    0 - Miller index: hkl
-    1 - Area of the slab
-    2 - Cell vector ax
-    3 - Cell vector ay
-    4 - Cell vector bx
-    5 - Cell vector by
-    6 - Length of reduced cell vector a
-    7 - Length of reduced cell vector b
-    8 - Angle between reduced cell vectors a and b
-    '''
-    data = [[f'{int(i[0])}{int(i[1])}{int(i[2])}', *i[3:]] for i in data]
-
-    return data
-
-def pair_slabs(data_lower, data_upper, area):
+def pair_slabs(data_lower, data_upper, area, area_tol=None):
     # Get miller indices and areas
     hkl_0 = [i[0] for i in data_lower]
     areas_0 = [i[1] for i in data_lower]
@@ -293,7 +226,7 @@ def pair_slabs(data_lower, data_upper, area):
 
     pairs = []
     for i, j in product(hkl_0, hkl_1):
-        int_list, ratio = find_int(target_0[i], target_1[j], area)
+        int_list, ratio = find_int(target_0[i], target_1[j], area, area_tol)
 
         ''' Data format:
         0 - Miller index hkl of lower slab
@@ -310,166 +243,92 @@ def pair_slabs(data_lower, data_upper, area):
     return pairs
 
 def cal_uv(data_slab, hkl, n):
-    # Find the possible i, j, m
-    ijm_list = find_ijm(n)
-
     # Get the vectors a, b
     data_hkl = [i for i in data_slab if i[0] == hkl][0]
-    s = data_hkl[1]
     a = data_hkl[2:4]
     b = data_hkl[4:6]
+
+    # Reuse the reduced supercells if the same slab basis and n were seen before in this run
+    return cal_uv_cached(tuple(a), tuple(b), n)
+
+@lru_cache(maxsize=UV_CACHE_SIZE)
+def cal_uv_cached(a, b, n):
+    # Find the possible i, j, m
+    ijm_list = find_ijm(n)
     ab = np.array([a, b])
     
-    # Calculate the supercell vectors u, v
-    data = []
-    for ijm in ijm_list:
-        ijm_matrix = np.array([[ijm[0], ijm[1]], [0, ijm[2]]])
-        supercell = np.dot(ijm_matrix, ab)
-        u, v = supercell[0], supercell[1]
-
-        u_ = np.array([supercell[0][0], supercell[0][1], 0.0])
-        v_ = np.array([supercell[1][0], supercell[1][1], 0.0])
-        S = np.linalg.norm(np.cross(u_, v_))
-
-        u_r_list, v_r_list, T_list = reduce(u, v)
-
-        # Only save the final reduced cell vectors
-        u_r, v_r, T_r = u_r_list[-1], v_r_list[-1], T_list[-1]
-        u_length_r, v_length_r = np.linalg.norm(u_r), np.linalg.norm(v_r)
-        uv_angle_r = np.arccos(np.dot(u_r, v_r) / (u_length_r * v_length_r)) * 180 / np.pi
-
-        # Store the data for each i, j, m
-        data.append([S, n, ijm[0], ijm[1], ijm[2], *T_r.flatten(), u_length_r, v_length_r, uv_angle_r])
+    # Calculate the supercell vectors u, v for all i, j, m at once
+    ijm = np.array(ijm_list)
+    ijm_matrices = np.zeros((len(ijm), 2, 2), dtype=int)
+    ijm_matrices[:, 0, 0] = ijm[:, 0]
+    ijm_matrices[:, 0, 1] = ijm[:, 1]
+    ijm_matrices[:, 1, 1] = ijm[:, 2]
+    supercells = ijm_matrices @ ab
+
+    u_ = np.zeros((len(ijm), 3))
+    v_ = np.zeros((len(ijm), 3))
+    u_[:, :2] = supercells[:, 0]
+    v_[:, :2] = supercells[:, 1]
+    S = np.linalg.norm(np.cross(u_, v_), axis=1)
+
+    # Reduce all supercells in one batch and only keep the final reduced cell vectors
+    reduced, T_r = reduce_batch(supercells)
+    u_r, v_r = reduced[:, 0], reduced[:, 1]
+    u_length_r, v_length_r = row_norm(u_r), row_norm(v_r)
+    uv_angle_r = np.arccos(row_dot(u_r, v_r) / (u_length_r * v_length_r)) * 180 / np.pi
+
+    # Store the data for each i, j, m
+    data = np.column_stack([S, np.full(len(ijm), n), ijm, T_r.reshape(-1, 4), u_length_r, v_length_r, uv_angle_r])
     
     # Compare lattice parameters and delete the same ones
     data, same_idx = trim(data)
 
     ''' Data format:
-    0 - Miller index: hkl
-    1 - Area of the supercell
-    2 - Scaling factor n
-    3 - Integer i
-    4 - Integer j
-    5 - Integer m
-    6 - Reduced super cell matrix T_r_1
-    7 - Reduced super cell matrix T_r_2
-    8 - Reduced super cell matrix T_r_3
-    9 - Reduced super cell matrix T_r_4
-    10 - Length of reduced super cell vector u
-    11 - Length of reduced super cell vector v
-    12 - Angle between reduced super cell vectors u and v
+    0 - Area of the supercell
+    1 - Scaling factor n
+    2 - Integer i
+    3 - Integer j
+    4 - Integer m
+    5 - Reduced super cell matrix T_r_1
+    6 - Reduced super cell matrix T_r_2
+    7 - Reduced super cell matrix T_r_3
+    8 - Reduced super cell matrix T_r_4
+    9 - Length of reduced super cell vector u
+    10 - Length of reduced super cell vector v
+    11 - Angle between reduced super cell vectors u and v
     '''
-    data = [[hkl, *i] for i in data]
+    data = np.array(data, dtype=float).reshape(-1, 12)
+
+    # The table is shared through the cache, so protect it from modification
+    data.flags.writeable = False
 
     return data
 
-def lattice_match(data_pairs, data_ab_lower, data_ab_upper):
-    data_matched = []
-    for i, row in enumerate(data_pairs):
-        hkl_0 = row[0]
-        hkl_1 = row[1]
-
-        int_list = row[5]
-        for int_ in int_list:
-            n_0 = int(int_[0])
-            n_1 = int(int_[1])
-
-            data_uv_lower = cal_uv(data_ab_lower, hkl_0, n_1)
-            data_uv_upper = cal_uv(data_ab_upper, hkl_1, n_0)
-
-            data_mis = []
-            for j, uv_lower in enumerate(data_uv_lower):
-                for k, uv_upper in enumerate(data_uv_upper):
-                    mis = cal_mis(uv_lower[10], uv_lower[11], uv_lower[12], uv_upper[10], uv_upper[11], uv_upper[12])
-                    data_mis.append([j, k, *mis])
-
-            data_mis = np.array(data_mis)
-            data_mis = data_mis[(data_mis[:, 2] < (UV_TOL / 100)) & (data_mis[:, 3] < (UV_TOL / 100)) & (data_mis[:, 4] < ANGLE_TOL)]
-
-            for mis in data_mis:
-                i, j = int(mis[0]), int(mis[1])
-                S_lower = data_uv_lower[i][1]
-                S_upper = data_uv_upper[j][1]
-                ijm_lower = data_uv_lower[i][3:6]
-                ijm_upper = data_uv_upper[j][3:6]
-                t_lower = data_uv_lower[i][6:10]
-                t_upper = data_uv_upper[j][6:10]
-                u_lower = data_uv_lower[i][10]
-                v_lower = data_uv_lower[i][11]
-                angle_lower = data_uv_lower[i][12]
-                u_upper = data_uv_upper[j][10]
-                v_upper = data_uv_upper[j][11]
-                angle_upper = data_uv_upper[j][12]
-
-                ijm_lower = np.array([[ijm_lower[0], ijm_lower[1]], [0, ijm_lower[2]]])
-                ijm_upper = np.array([[ijm_upper[0], ijm_upper[1]], [0, ijm_upper[2]]])
-                t_lower = np.array([[t_lower[0], t_lower[1]], [t_lower[2], t_lower[3]]])
-                t_upper = np.array([[t_upper[0], t_upper[1]], [t_upper[2], t_upper[3]]])
-                T_lower = np.dot(t_lower, ijm_lower)
-                T_upper = np.dot(t_upper, ijm_upper)
-                
-                ''' Data format:
-                0 - Miller index hkl of lower slab
-                1 - Miller index hkl of upper slab
-                2 - u_mis
-                3 - v_mis
-                4 - angle_mis
-                5 - Area of lower slab
-                6 - Area of upper slab
-                7 - Transformed matrix T1 of lower slab
-                8 - Transformed matrix T2 of lower slab
-                9 - Transformed matrix T3 of lower slab
-                10 - Transformed matrix T4 of lower slab
-                11 - Transformed matrix T1 of upper slab
-                12 - Transformed matrix T2 of upper slab
-                13 - Transformed matrix T3 of upper slab
-                14 - Transformed matrix T4 of upper slab
-                15 - Length of reduced super cell vector u of lower slab
-                16 - Length of reduced super cell vector v of lower slab
-                17 - Angle between reduced super cell vectors u and v of lower slab
-                18 - Length of reduced super cell vector u of upper slab
-                19 - Length of reduced super cell vector v of upper slab
-                20 - Angle between reduced super cell vectors u and v of upper slab
-                '''
-                data_matched.append([hkl_0, hkl_1, *mis[2:], S_lower, S_upper, *T_lower.flatten(), *T_upper.flatten(), u_lower, v_lower, angle_lower, u_upper, v_upper, angle_upper])
-    return data_matched
+def expand_windows(order, lo, hi):
+    # Expand the sorted windows [lo, hi) of every query into (query, item) index pairs
+    counts = hi - lo
+    j = np.repeat(np.arange(len(lo)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    k = order[np.repeat(lo, counts) + offsets]
 
-def filter_data(data_matched, MIN_AREA):
-    if len(data_matched) > 1:
-        data_matched = np.array(data_matched)
+    return j, k
 
-        # # Compare the areas and get the closest area to the MIN_AREA
-        # area_diff = data_matched[:, 5].astype(float) - MIN_AREA
-        # area_diff_sorted = np.sort(area_diff)
-        # # Get the idx of the first positive value in area_diff_sorted
-        # idx_0 = np.where(area_diff_sorted > 0)[0][0]
-        # idxes = np.where(area_diff == area_diff_sorted[idx_0])[0]
-        # data_matched = data_matched[idxes]
+def find_uv_pairs(u_lengths_0, u_lengths_1, uv_tol):
+    # Sort the upper u lengths once and query the window |u_0 - u_1| < uv_tol * u_0 for every lower u length
+    order = np.argsort(u_lengths_1, kind='stable')
+    u_sorted = u_lengths_1[order]
 
-        if SHAPE_FILTER:
-            # Compare the u, v lengths and calculate the uv_ratio = u / v
-            u, v = data_matched[:, 15], data_matched[:, 16]
-            # Change the u, v to float type and calculate the uv_ratio
-            u, v = u.astype(float), v.astype(float)
-            uv_ratio = np.abs(u / v - 1)
-            # Filter the data using the min uv_ratio
-            min_idx = np.argmin(uv_ratio)
-            data_matched = [data_matched[min_idx].tolist()]
-            # Change items in data_matched to float type
-            for i in range(2, len(data_matched[0])):
-                data_matched[0][i] = float(data_matched[0][i])
-        else:
-            data_matched = data_matched.tolist()
-            # Change items in data_matched to float type
-            for data in data_matched:
-                for i in range(2, len(data)):
-                    data[i] = float(data[i])
-        
-        min_area = data_matched[0][5]
-        return data_matched, min_area
-    else:
-        min_area = data_matched[0][5]
-        return data_matched, min_area
+    # Slightly widen the windows, the exact misfit criteria are applied afterwards
+    margin = uv_tol * u_lengths_0 * (1 + 1e-9) + 1e-12
+    lo = np.searchsorted(u_sorted, u_lengths_0 - margin, side='left')
+    hi = np.searchsorted(u_sorted, u_lengths_0 + margin, side='right')
+
+    j, k = expand_windows(order, lo, hi)
+
+    # Keep the lower-major, upper-minor ordering of a full double loop
+    idx = np.lexsort((k, j))
+
+    return j[idx], k[idx]
 
 def find_hkl(h_max, k_max, l_max):
     hkl_list = []
@@ -484,106 +343,820 @@ def find_hkl(h_max, k_max, l_max):
                     hkl_list.append((h, k, l))
     return hkl_list
 
-def run_interface_maker(lower_conv, upper_conv, lower_hkl, upper_hkl, min_area, max_area, slab_vacuum, interface_gap, lower_slab_layers, upper_slab_layers, uv_tol, angle_tol, shape_filter, output_dir):
-    global LOWER_CONV, UPPER_CONV, MIN_AREA, MAX_AREA, SLAB_VACUUM, INTERFACE_GAP, LOWER_SLAB_LAYERS, UPPER_SLAB_LAYERS, UV_TOL, ANGLE_TOL, SHAPE_FILTER, LOWER_HKL, UPPER_HKL, OUTPUT_DIR
-    LOWER_CONV, UPPER_CONV = lower_conv, upper_conv
-    LOWER_HKL, UPPER_HKL = [lower_hkl], [upper_hkl]
-    MIN_AREA, MAX_AREA = min_area, max_area
-    SLAB_VACUUM = slab_vacuum
-    INTERFACE_GAP = interface_gap
-    LOWER_SLAB_LAYERS = lower_slab_layers
-    UPPER_SLAB_LAYERS = upper_slab_layers
-    UV_TOL = uv_tol
-    ANGLE_TOL = angle_tol
-    SHAPE_FILTER = shape_filter
-    OUTPUT_DIR = output_dir
-
-    # print(f'\nAssigned Miller indices for lower slab: {LOWER_HKL}; upper slab: {UPPER_HKL}')
-
-    # Create slabs folder
-    if not os.path.exists(f'{OUTPUT_DIR}/slabs'):
-        os.makedirs(f'{OUTPUT_DIR}/slabs')
-    else:
-        shutil.rmtree(f'{OUTPUT_DIR}/slabs')
-        os.makedirs(f'{OUTPUT_DIR}/slabs')
+def reduce_hkl(hkl_list, rotations):
+    # Keep the first Miller indices of each family, (h, k, l) and (-h, -k, -l) give the same slab lattice
+    # The rotations act on fractional coordinates, so the Miller indices as row vectors transform as hkl @ R
+    seen = set()
+    hkl_unique = []
+    for hkl in hkl_list:
+        if tuple(hkl) in seen:
+            continue
+        hkl_unique.append(hkl)
+        family = np.array(hkl) @ rotations
+        seen.update(map(tuple, family.tolist()))
+        seen.update(map(tuple, (-family).tolist()))
+    return hkl_unique
+
+def find_hkl_unique(cell_conv, h_max, k_max, l_max, symprec=0.01):
+    # Miller indices up to the maxima with one representative per family of symmetry-equivalent surfaces of the bulk
+    from pymatgen.core import Structure
+    from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+    structure = Structure.from_file(cell_conv)
+    operations = SpacegroupAnalyzer(structure, symprec=symprec).get_symmetry_operations(cartesian=False)
+    rotations = np.rint([op.rotation_matrix for op in operations]).astype(int)
+    return reduce_hkl(find_hkl(h_max, k_max, l_max), rotations)
+
+def make_candidates(hkl, values, n_atoms_lower, n_atoms_upper):
+    # Convert the hkl pairs and matched rows of lattice_match into the typed candidate table
+    candidates = np.zeros(len(values), dtype=CANDIDATE_DTYPE)
+    if len(values) == 0:
+        return candidates
+    candidates['hkl_0'], candidates['hkl_1'] = hkl[:, 0], hkl[:, 1]
+    candidates['u_mis'], candidates['v_mis'], candidates['angle_mis'] = values[:, 0], values[:, 1], values[:, 2]
+    candidates['area_0'], candidates['area_1'] = values[:, 3], values[:, 4]
+    candidates['area_mis'] = np.abs(values[:, 3] - values[:, 4]) / values[:, 3]
+    candidates['T_0'] = values[:, 5:9].reshape(-1, 2, 2)
+    candidates['T_1'] = values[:, 9:13].reshape(-1, 2, 2)
+    candidates['uv_0'] = values[:, 13:16]
+    candidates['uv_1'] = values[:, 16:19]
+
+    # The supercell of a slab holds |det T| copies of its atoms
+    n_0 = np.array([n_atoms_lower[hkl] for hkl in candidates['hkl_0']])
+    n_1 = np.array([n_atoms_upper[hkl] for hkl in candidates['hkl_1']])
+    candidates['n_atoms'] = np.rint(n_0 * np.abs(np.linalg.det(candidates['T_0'])) + n_1 * np.abs(np.linalg.det(candidates['T_1'])))
+    return candidates
+
+def select_matches(values, top_k, metric='area'):
+    # Keep the best top_k rows of lattice_match by the metric, in their original order so that ties keep the search order
+    if len(values) <= top_k:
+        return values
+    columns = {
+        'area_0': values[:, 3],
+        'uv_mis': values[:, 0] + values[:, 1],
+        'angle_mis': values[:, 2],
+        'area_mis': np.abs(values[:, 3] - values[:, 4]) / values[:, 3],
+        }
+    keys = [columns[key] for key in CANDIDATE_METRICS[metric]]
+    order = np.lexsort([np.arange(len(values)), *keys[::-1]])
+    return values[np.sort(order[:top_k])]
+
+def rank_candidates(candidates, metric='area'):
+    # Stable sort of the candidate table by the given metric, ties keep the search order
+    if metric not in CANDIDATE_METRICS:
+        raise ValueError(f'Unknown candidate metric: {metric}. Available metrics: {list(CANDIDATE_METRICS)}')
+    columns = {'uv_mis': candidates['u_mis'] + candidates['v_mis']}
+    keys = [columns[key] if key in columns else candidates[key] for key in CANDIDATE_METRICS[metric]]
+    order = np.lexsort(keys[::-1])
+    return candidates[order]
+
+def hash_file(path):
+    # Content hash of a bulk structure file, so that renamed or copied files share their slabs
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+@lru_cache(maxsize=BULK_CACHE_SIZE)
+def load_bulk(path, content_hash):
+    # The content hash is part of the cache key, so an edited file is read again
+    return read(path)
+
+@lru_cache(maxsize=SLAB_CACHE_SIZE)
+def load_slab(path, content_hash, hkl, layers, vacuum, cache_dir=None):
+    # Slabs are stored on disk by the hash of the bulk content, Miller indices, layers, vacuum and ASE version
+    key = hashlib.sha256(f'{content_hash}|{hkl}|{layers}|{float(vacuum)!r}|{ase_version}'.encode()).hexdigest()
+    cache_file = os.path.join(cache_dir, f'{key}.npz') if cache_dir is not None else None
+
+    if cache_file is not None and os.path.isfile(cache_file):
+        try:
+            with np.load(cache_file, allow_pickle=False) as f:
+                slab = Atoms(cell=f['cell'], pbc=f['pbc'])
+                for name in f.files:
+                    if name.startswith('array_'):
+                        slab.arrays[name[6:]] = f[name]
+                data = f['data'].tolist()
+            return slab, data
+        except Exception:
+            # Rebuild the slab if the cache file is unreadable
+            pass
+
+    slab = surface(lattice=load_bulk(path, content_hash), indices=hkl, layers=layers, vacuum=vacuum, tol=1e-10, periodic=True)
+
+    # Get cell parameters
+    cell = slab.cell
+    a, b = cell[0][:2], cell[1][:2]
+
+    a_ = np.array([cell[0][0], cell[0][1], 0.0])
+    b_ = np.array([cell[1][0], cell[1][1], 0.0])
+    S = np.linalg.norm(np.cross(a_, b_))
+
+    # Reduce the cell vectors
+    a_r, b_r, T = reduce(a, b)
+    a_length_r, b_length_r = np.linalg.norm(a_r), np.linalg.norm(b_r)
+    ab_angle_r = np.arccos(np.dot(a_r, b_r) / (a_length_r * b_length_r)) * 180 / np.pi
+
+    ''' Data format:
+    0 - Area of the slab
+    1 - Cell vector ax
+    2 - Cell vector ay
+    3 - Cell vector bx
+    4 - Cell vector by
+    5 - Length of reduced cell vector a
+    6 - Length of reduced cell vector b
+    7 - Angle between reduced cell vectors a and b
+    '''
+    data = [S, *a, *b, a_length_r, b_length_r, ab_angle_r]
+
+    # Constraints are not stored, so constrained slabs are only kept in memory
+    if cache_file is not None and not slab.constraints:
+        os.makedirs(cache_dir, exist_ok=True)
+        arrays = {f'array_{name}': value for name, value in slab.arrays.items()}
+        # Write to a temporary file first so that parallel runs never read a partial file
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, cell=slab.cell[:], pbc=slab.pbc, data=np.array(data), **arrays)
+        os.replace(tmp_file, cache_file)
+
+    return slab, data
+
+class InterfaceMaker:
+    '''
+    Lattice-matched interface search between two bulk structures.
+    All parameters are carried by the instance, so that several searches can run in parallel threads or processes.
+    '''
+
+    def __init__(self, lower_conv, upper_conv, output_dir, lower_hkl=None, upper_hkl=None, min_area=50.0, max_area=500.0, slab_vacuum=15.0, interface_gap=2.0, lower_slab_layers=4, upper_slab_layers=4, uv_tol=5.0, angle_tol=5.0, area_tol=None, shape_filter=False, write_slabs=True, slab_cache_dir=None, reuse_matches=True, output_format='vasp', match_top_k=None, match_metric='area'):
+        if output_format not in ('vasp', 'extxyz'):
+            raise ValueError(f'Unknown output format: {output_format}. Available formats: vasp, extxyz')
+        # The atom counts of the interfaces are only known once the slabs are matched, so they cannot rank the streamed matches
+        if match_metric not in CANDIDATE_METRICS or match_metric == 'n_atoms':
+            raise ValueError(f'Unknown match metric: {match_metric}. Available metrics: {[i for i in CANDIDATE_METRICS if i != "n_atoms"]}')
+        self.lower_conv, self.upper_conv = lower_conv, upper_conv
+        self.lower_hkl, self.upper_hkl = lower_hkl, upper_hkl
+        self.min_area, self.max_area = min_area, max_area
+        self.slab_vacuum = slab_vacuum
+        self.interface_gap = interface_gap
+        self.lower_slab_layers = lower_slab_layers
+        self.upper_slab_layers = upper_slab_layers
+        self.uv_tol = uv_tol
+        self.angle_tol = angle_tol
+        self.area_tol = area_tol
+        self.shape_filter = shape_filter
+        self.write_slabs = write_slabs
+        self.slab_cache_dir = slab_cache_dir
+        self.reuse_matches = reuse_matches
+        self.output_format = output_format
+        self.match_top_k, self.match_metric = match_top_k, match_metric
+        self.output_dir = output_dir
+
+        # Number of duplicate slabs and supercells removed by trim, per slab and per (slab, n) supercell table
+        self.trimmed_slabs, self.trimmed_supercells = {}, {}
+
+    def slab_maker(self, cell_conv, miller_indices, vacuum, layers):
+        cell_name = f'{cell_conv.split("/")[-1].split(".")[0]}'
+
+        data = []
+        slabs = []
+
+        # Slabs are shared between runs through the in-memory and on-disk caches, the bulk is only read on a miss
+        content_hash = hash_file(cell_conv)
+        for h, k, l in miller_indices:
+            slab, data_slab = load_slab(cell_conv, content_hash, (int(h), int(k), int(l)), layers, vacuum, self.slab_cache_dir)
+        
+            # Store the slab data for each Miller index
+            data.append([h, k, l, *data_slab])
+            slabs.append(slab)
+
+        # Compare lattice parameters and delete the same ones
+        data, same_idx = trim(data)
+        self.trimmed_slabs[cell_name] = len(same_idx)
+    
+        # Keep the unique slabs in memory for the interface generation and optionally write them
+        slabs_hkl = {}
+        if self.write_slabs:
+            os.makedirs(f'{self.output_dir}/slabs', exist_ok=True)
+        for i, slab in enumerate(slabs):
+            h, k, l = miller_indices[i]
+            if i not in same_idx:
+                # Sort the atoms by element in the same way as the written slab files
+                slabs_hkl[f'{h}{k}{l}'] = slab[np.argsort(slab.symbols)]
+                if self.write_slabs:
+                    write(f'{self.output_dir}/slabs/slab_{h}{k}{l}_{cell_name}.vasp', slab, format='vasp', direct=True, sort=True)
+
+        ''' Data format:
+        0 - Miller index: hkl
+        1 - Area of the slab
+        2 - Cell vector ax
+        3 - Cell vector ay
+        4 - Cell vector bx
+        5 - Cell vector by
+        6 - Length of reduced cell vector a
+        7 - Length of reduced cell vector b
+        8 - Angle between reduced cell vectors a and b
+        '''
+        data = [[f'{int(i[0])}{int(i[1])}{int(i[2])}', *i[3:]] for i in data]
+
+        return data, slabs_hkl
+
+    def lattice_match(self, data_pairs, data_ab_lower, data_ab_upper, top_k=None, metric='area'):
+        # Stream the matched supercell pairs into a float array, only keeping the best top_k rows if given
+        chunks, n_rows = [], 0
+        for i, row in enumerate(data_pairs):
+            hkl_0 = row[0]
+            hkl_1 = row[1]
+
+            int_list = row[5]
+            for int_ in int_list:
+                n_0 = int(int_[0])
+                n_1 = int(int_[1])
+
+                data_uv_lower = cal_uv(data_ab_lower, hkl_0, n_1)
+                data_uv_upper = cal_uv(data_ab_upper, hkl_1, n_0)
+
+                # The supercell tables are cached, so count the duplicates removed by trim from the table sizes
+                self.trimmed_supercells[('lower', hkl_0, n_1)] = len(find_ijm(n_1)) - len(data_uv_lower)
+                self.trimmed_supercells[('upper', hkl_1, n_0)] = len(find_ijm(n_0)) - len(data_uv_upper)
+
+                # Only compare the supercell pairs whose u lengths can be within the tolerance
+                j, k = find_uv_pairs(data_uv_lower[:, 9], data_uv_upper[:, 9], self.uv_tol / 100)
+                uv_lower, uv_upper = data_uv_lower[j, 9:12], data_uv_upper[k, 9:12]
+                u_mis, v_mis, angle_mis = cal_mis(uv_lower[:, 0], uv_lower[:, 1], uv_lower[:, 2], uv_upper[:, 0], uv_upper[:, 1], uv_upper[:, 2])
+
+                mask = (u_mis < (self.uv_tol / 100)) & (v_mis < (self.uv_tol / 100)) & (angle_mis < self.angle_tol)
+                if not mask.any():
+                    continue
+                j, k = j[mask], k[mask]
+
+                # Transformed matrices T = T_r @ ijm of the matched supercells
+                ijm_lower = np.zeros((len(j), 2, 2))
+                ijm_lower[:, 0, 0], ijm_lower[:, 0, 1], ijm_lower[:, 1, 1] = data_uv_lower[j, 2], data_uv_lower[j, 3], data_uv_lower[j, 4]
+                ijm_upper = np.zeros((len(k), 2, 2))
+                ijm_upper[:, 0, 0], ijm_upper[:, 0, 1], ijm_upper[:, 1, 1] = data_uv_upper[k, 2], data_uv_upper[k, 3], data_uv_upper[k, 4]
+                T_lower = data_uv_lower[j, 5:9].reshape(-1, 2, 2) @ ijm_lower
+                T_upper = data_uv_upper[k, 5:9].reshape(-1, 2, 2) @ ijm_upper
+
+                ''' Data format:
+                0 - u_mis
+                1 - v_mis
+                2 - angle_mis
+                3 - Area of lower slab
+                4 - Area of upper slab
+                5 - Transformed matrix T1 of lower slab
+                6 - Transformed matrix T2 of lower slab
+                7 - Transformed matrix T3 of lower slab
+                8 - Transformed matrix T4 of lower slab
+                9 - Transformed matrix T1 of upper slab
+                10 - Transformed matrix T2 of upper slab
+                11 - Transformed matrix T3 of upper slab
+                12 - Transformed matrix T4 of upper slab
+                13 - Length of reduced super cell vector u of lower slab
+                14 - Length of reduced super cell vector v of lower slab
+                15 - Angle between reduced super cell vectors u and v of lower slab
+                16 - Length of reduced super cell vector u of upper slab
+                17 - Length of reduced super cell vector v of upper slab
+                18 - Angle between reduced super cell vectors u and v of upper slab
+                '''
+                data = np.column_stack([
+                    u_mis[mask], v_mis[mask], angle_mis[mask],
+                    data_uv_lower[j, 0], data_uv_upper[k, 0],
+                    T_lower.reshape(-1, 4), T_upper.reshape(-1, 4),
+                    data_uv_lower[j, 9:12], data_uv_upper[k, 9:12],
+                    ])
+                chunks.append(data)
+                n_rows += len(data)
+
+                # Merge the kept rows with the new ones once twice top_k rows are held
+                if top_k is not None and n_rows > 2 * top_k:
+                    chunks = [select_matches(np.concatenate(chunks), top_k, metric)]
+                    n_rows = len(chunks[0])
+
+        data_matched = np.concatenate(chunks) if chunks else np.zeros((0, MATCH_COLUMNS))
+        if top_k is not None:
+            data_matched = select_matches(data_matched, top_k, metric)
+        return data_matched
+
+    def filter_data(self, data_matched):
+        # # Compare the areas and get the closest area to the min_area
+        # area_diff = data_matched[:, 3] - self.min_area
+        # area_diff_sorted = np.sort(area_diff)
+        # # Get the idx of the first positive value in area_diff_sorted
+        # idx_0 = np.where(area_diff_sorted > 0)[0][0]
+        # idxes = np.where(area_diff == area_diff_sorted[idx_0])[0]
+        # data_matched = data_matched[idxes]
+
+        if self.shape_filter and len(data_matched) > 1:
+            # Compare the u, v lengths and calculate the uv_ratio = u / v
+            u, v = data_matched[:, 13], data_matched[:, 14]
+            uv_ratio = np.abs(u / v - 1)
+            # Filter the data using the min uv_ratio
+            min_idx = np.argmin(uv_ratio)
+            data_matched = data_matched[[min_idx]]
+
+        min_area = data_matched[0, 3]
+        return data_matched, min_area
+
+    def build_intf(self, candidate):
+        hkl_0, hkl_1 = str(candidate['hkl_0']), str(candidate['hkl_1'])
     
-    # Create slabs for lower and upper materials
-    data_ab_lower = slab_maker(cell_conv=LOWER_CONV, miller_indices=LOWER_HKL, vacuum=SLAB_VACUUM, layers=LOWER_SLAB_LAYERS)
-    data_ab_upper = slab_maker(cell_conv=UPPER_CONV, miller_indices=UPPER_HKL, vacuum=SLAB_VACUUM, layers=UPPER_SLAB_LAYERS)
-
-    # Create interfaces folder
-    if not os.path.exists(f'{OUTPUT_DIR}/interfaces'):
-        os.makedirs(f'{OUTPUT_DIR}/interfaces')
-    else:
-        shutil.rmtree(f'{OUTPUT_DIR}/interfaces')
-        os.makedirs(f'{OUTPUT_DIR}/interfaces')
-
-    with open(f'{OUTPUT_DIR}/interface_maker.log', 'w') as f:
-        f.write('-'.center(70, '-') + '\n\n')
-        f.write('Masgent - Interface Maker'.center(70) + '\n')
-        f.write('-------------------------'.center(70) + '\n')
-        f.write('Copyright (c) 2025 Guangchen Liu'.center(70) + '\n\n')
-        f.write('Cite Us: https://doi.org/10.1016/j.mtphys.2025.101940'.center(70) + '\n\n')
-        f.write(f'Aassigned Miller indices:'.center(70) + '\n')
-        f.write(f'Lower slab: {LOWER_HKL[0]}'.center(70) + '\n')
-        f.write(f'Upper slab: {UPPER_HKL[0]}'.center(70) + '\n')
-        f.write('\n')
-        if SHAPE_FILTER:
-            f.write('Warning: Shape filter is ON! '.center(70) + '\n')
-            f.write('Only the most square-like interface will be kept!'.center(70) + '\n')
+        # Transform the 2x2 T matrix to 3x3 T matrix
+        T_0 = np.vstack([candidate['T_0'], [0, 0]])
+        T_0 = np.hstack([T_0, [[0], [0], [1]]])
+        T_1 = np.vstack([candidate['T_1'], [0, 0]])
+        T_1 = np.hstack([T_1, [[0], [0], [1]]])
+
+        # Get the slab data built by slab_maker
+        slab_0 = self.slabs_lower[hkl_0]
+        slab_1 = self.slabs_upper[hkl_1]
+
+        # Transform the slab data
+        slab_0 = make_supercell(slab_0, T_0, order='atom-major')
+        slab_1 = make_supercell(slab_1, T_1, order='atom-major')
+
+        # Create slab_0_reverse and slab_1_reverse for the reversed z-axis
+        slab_0_reverse = slab_0.copy()
+        slab_1_reverse = slab_1.copy()
+        slab_0_reverse.positions[:, 2] = slab_0.cell[2, 2] - slab_0.positions[:, 2]
+        slab_1_reverse.positions[:, 2] = slab_1.cell[2, 2] - slab_1.positions[:, 2]
+
+        # Keep the transformed slabs before they are stacked into the interfaces
+        slabs = (slab_0.copy(), slab_1.copy())
+
+        interfaces = []
+        comb = [(slab_0, slab_1), (slab_0_reverse, slab_1), (slab_0, slab_1_reverse), (slab_0_reverse, slab_1_reverse)]
+        for slab_0, slab_1 in comb:
+
+            # Compare the areas of slab_0 and slab_1, let slab_0 be the lower slab with the larger area
+            area_0, area_1 = candidate['area_0'], candidate['area_1']
+            reversed = False
+            if area_0 < area_1:
+                slab_0, slab_1 = slab_1, slab_0
+                reversed = True
+
+            # Get the thickness of slab_0, slab_1, and interface
+            z_0 = slab_0.positions[:, 2]
+            z_1 = slab_1.positions[:, 2]
+            slab_0_thickness = z_0.max() - z_0.min()
+            slab_1_thickness = z_1.max() - z_1.min()
+            interface_thickness = slab_0_thickness + slab_1_thickness + self.slab_vacuum * 2 + self.interface_gap
+
+            # Create the interface 
+            interface = slab_0.copy()
+            interface.set_cell([slab_0.cell[0], slab_0.cell[1], [0, 0, interface_thickness]])
+
+            # Reverse the z-axis
+            interface.positions[:, 2] = interface_thickness-interface.positions[:, 2]
+
+            # Get the global coordinates of the atoms in interface and slab_1
+            cell = interface.cell
+            slab_1_cell = slab_1.cell
+        
+            cell_ = cell.copy()
+            cell_[2] = slab_1_cell[2]
+            slab_1_positions = slab_1.positions
+
+            # Transform the slab_1 to the global coordinates of interface
+            slab_1_positions_frac = np.dot(np.linalg.inv(slab_1_cell.T), slab_1_positions.T).T
+            slab_1_positions_global = np.dot(cell_.T, slab_1_positions_frac.T).T
+            slab_1.cell = cell
+            slab_1.positions = slab_1_positions_global
+
+            # Shift the interface lower
+            z_bottom_interface = interface.positions[:, 2].min()
+            z_disp_interface = z_bottom_interface - self.slab_vacuum
+            interface.translate([0, 0, -z_disp_interface])
+
+            # Shift the slab_1 upper
+            z_top_slab_1 = slab_1.positions[:, 2].max()
+            z_disp_slab_1 = interface_thickness - self.slab_vacuum - z_top_slab_1
+            slab_1.translate([0, 0, z_disp_slab_1])
+
+            # Create the interface
+            interface.extend(slab_1)
+
+            # Reverse the z-axis if needed
+            if reversed:
+                interface.positions[:, 2] = interface_thickness-interface.positions[:, 2]
+
+            interfaces.append(interface)
+
+        return slabs, interfaces
+
+    def iter_interfaces(self, candidates, rows=None, top_k=None):
+        # Build the slabs and interfaces only for the requested rows, or the first top_k rows, of the candidate table
+        if rows is None:
+            rows = range(len(candidates) if top_k is None else min(top_k, len(candidates)))
+        for i in rows:
+            slabs, interfaces = self.build_intf(candidates[i])
+            yield i, slabs, interfaces
+
+    def gen_intf(self, i, candidate, slabs, interfaces, archives=None):
+        hkl_0, hkl_1 = str(candidate['hkl_0']), str(candidate['hkl_1'])
+        T_0, T_1 = candidate['T_0'], candidate['T_1']
+        area_0, area_1 = candidate['area_0'], candidate['area_1']
+
+        # Write the transformed slab data, as POSCARs or as frames of the slab archive
+        if archives is None:
+            save_path = f'{self.output_dir}/interfaces/intf_{i+1}_slabs'
+            os.makedirs(save_path)
+            write(f'{save_path}/intf_{i+1}_slab_0_{hkl_0}.vasp', slabs[0], format='vasp', direct=True, sort=True)
+            write(f'{save_path}/intf_{i+1}_slab_1_{hkl_1}.vasp', slabs[1], format='vasp', direct=True, sort=True)
+        else:
+            for slab_id, (slab, hkl) in enumerate(zip(slabs, (hkl_0, hkl_1))):
+                # Sort the atoms by element in the same way as the POSCARs
+                frame = slab[np.argsort(slab.symbols)]
+                frame.info = {'interface_id': i + 1, 'slab_id': slab_id, 'hkl': f'({hkl})'}
+                write(archives[1], frame, format='extxyz')
+
+        log_lines, csv_lines = [], []
+        for j, interface in enumerate(interfaces):
+            # Write the interface, as a POSCAR or as a frame of the interface archive with the csv data
+            if archives is None:
+                write(f'{self.output_dir}/interfaces/intf_{i+1}_{j+1}_{hkl_0}_{hkl_1}.vasp', interface, format='vasp', direct=True, sort=True)
+            else:
+                frame = interface[np.argsort(interface.symbols)]
+                frame.info = {
+                    'interface_id': i + 1,
+                    'surface_id': j + 1,
+                    'total_atoms': len(interface),
+                    'lower_hkl': f'({hkl_0})',
+                    'upper_hkl': f'({hkl_1})',
+                    'lower_area': area_0,
+                    'upper_area': area_1,
+                    'u_misfit': candidate['u_mis'] * 100,
+                    'v_misfit': candidate['v_mis'] * 100,
+                    'angle_misfit': candidate['angle_mis'],
+                    'area_misfit': candidate['area_mis'] * 100,
+                    'T_0': T_0.flatten(),
+                    'T_1': T_1.flatten(),
+                    }
+                write(archives[0], frame, format='extxyz')
+
+            # Collect the lattice matching data for the log file
+            log_lines.append(f' Interface {i+1}-{j+1} '.center(70, '-') + '\n')
+
+            log_lines.append('Total atoms:'.ljust(50) + f'{len(interface)}\n')
+            log_lines.append('Lower / Upper hkl:'.ljust(50) + f'({hkl_0}) / ({hkl_1})\n')
+            log_lines.append('Lower / Upper area (A^2):'.ljust(50) + f'{area_0:.2f} / {area_1:.2f}\n')
+            log_lines.append('\n')
+
+            log_lines.append('U misfit (%):'.ljust(50) + f'{candidate["u_mis"] * 100:.6f}\n')
+            log_lines.append('V misfit (%):'.ljust(50) + f'{candidate["v_mis"] * 100:.6f}\n')
+            log_lines.append('Angle misfit (°):'.ljust(50) + f'{candidate["angle_mis"]:.6f}\n')
+            log_lines.append('Area misfit (%):'.ljust(50) + f'{candidate["area_mis"] * 100:.6f}\n')
+            log_lines.append('\n')
+
+            log_lines.append('Transformed matrix for lower slab:\n')
+            log_lines.append(f'{T_0[0][0]:.6f}  {T_0[0][1]:.6f}\n')
+            log_lines.append(f'{T_0[1][0]:.6f}  {T_0[1][1]:.6f}\n')
+            log_lines.append('\n')
+
+            log_lines.append('Transformed matrix for upper slab:\n')
+            log_lines.append(f'{T_1[0][0]:.6f}  {T_1[0][1]:.6f}\n')
+            log_lines.append(f'{T_1[1][0]:.6f}  {T_1[1][1]:.6f}\n')
+            log_lines.append('\n')
+        
+            # Collect the lattice matching data for the csv file
+            csv_lines.append(f'{i+1},{j+1},{len(interface)},{hkl_0},{hkl_1},{area_0:.6f},{area_1:.6f},{candidate["u_mis"]*100:.6f},{candidate["v_mis"]*100:.6f},{candidate["angle_mis"]:.6f},{candidate["area_mis"]*100:.6f},{T_0[0][0]:.6f},{T_0[0][1]:.6f},{T_0[1][0]:.6f},{T_0[1][1]:.6f},{T_1[0][0]:.6f},{T_1[0][1]:.6f},{T_1[1][0]:.6f},{T_1[1][1]:.6f}\n')
+
+        return log_lines, csv_lines
+
+    def search(self, metric=None):
+        lower_hkls, upper_hkls = [self.lower_hkl], [self.upper_hkl]
+        self.trimmed_slabs, self.trimmed_supercells = {}, {}
+
+        # Create slabs for lower and upper materials and keep them for the interface generation
+        data_ab_lower, self.slabs_lower = self.slab_maker(cell_conv=self.lower_conv, miller_indices=lower_hkls, vacuum=self.slab_vacuum, layers=self.lower_slab_layers)
+        data_ab_upper, self.slabs_upper = self.slab_maker(cell_conv=self.upper_conv, miller_indices=upper_hkls, vacuum=self.slab_vacuum, layers=self.upper_slab_layers)
+        n_atoms_lower = {hkl: len(slab) for hkl, slab in self.slabs_lower.items()}
+        n_atoms_upper = {hkl: len(slab) for hkl, slab in self.slabs_upper.items()}
+
+        # Reuse the unfiltered matches of an earlier run on the same slab bases, or match the lattices again
+        # Without the shape filter only the best match_top_k matches of each hkl pair are kept during the search
+        top_k = None if self.shape_filter else self.match_top_k
+        key = self.match_key(data_ab_lower, data_ab_upper, top_k)
+        matches = self.load_matches(key, top_k) if self.reuse_matches else None
+        if matches is None:
+            matches = {}
+            for hkl_0, hkl_1 in product(lower_hkls, upper_hkls):
+                # Get the slab data in data_ab_lower and data_ab_upper using the Miller indices
+                lower_hkl = f'{hkl_0[0]}{hkl_0[1]}{hkl_0[2]}'
+                upper_hkl = f'{hkl_1[0]}{hkl_1[1]}{hkl_1[2]}'
+                data_ab_lower_hkl = [i for i in data_ab_lower if i[0] == lower_hkl]
+                data_ab_upper_hkl = [i for i in data_ab_upper if i[0] == upper_hkl]
+
+                if len(data_ab_lower_hkl) == 1 and len(data_ab_upper_hkl) == 1:
+                    # Match the lattices of the lower and upper slabs
+                    data_pairs = pair_slabs(data_ab_lower_hkl, data_ab_upper_hkl, self.max_area, self.area_tol)
+                    matches[(lower_hkl, upper_hkl)] = self.lattice_match(data_pairs, data_ab_lower_hkl, data_ab_upper_hkl, top_k=top_k, metric=self.match_metric)
+            self.save_matches(key, matches, top_k)
+
+        # Get the product of the Miller indices
+        hkl_all, data_matched_all = [], []
+        summary = []
+        for hkl_0, hkl_1 in product(lower_hkls, upper_hkls):
+            lower_hkl = f'{hkl_0[0]}{hkl_0[1]}{hkl_0[2]}'
+            upper_hkl = f'{hkl_1[0]}{hkl_1[1]}{hkl_1[2]}'
+            if (lower_hkl, upper_hkl) not in matches:
+                continue
+
+            # Apply the current tolerances, the stored matches were searched with the same or looser ones
+            values = matches[(lower_hkl, upper_hkl)]
+            mask = (values[:, 0] < (self.uv_tol / 100)) & (values[:, 1] < (self.uv_tol / 100)) & (values[:, 2] < self.angle_tol)
+            data_matched = values[mask]
+            if len(data_matched) == 0:
+                summary.append((hkl_0, hkl_1, None))
+            else:
+                data_matched, min_area = self.filter_data(data_matched)
+                hkl_all.extend([(lower_hkl, upper_hkl)] * len(data_matched))
+                data_matched_all.append(data_matched)
+                summary.append((hkl_0, hkl_1, min_area))
+
+        ''' Summary format:
+        0 - Miller indices of lower slab
+        1 - Miller indices of upper slab
+        2 - Area of the first matched interface, None if nothing matched
+        '''
+        hkl_all = np.array(hkl_all, dtype='U16').reshape(-1, 2)
+        data_matched_all = np.concatenate(data_matched_all) if data_matched_all else np.zeros((0, MATCH_COLUMNS))
+        candidates = make_candidates(hkl_all, data_matched_all, n_atoms_lower, n_atoms_upper)
+        if metric is not None:
+            candidates = rank_candidates(candidates, metric)
+        return candidates, summary
+
+    def match_key(self, data_ab_lower, data_ab_upper, top_k=None):
+        # The matches only depend on the in-plane slab bases, the Miller indices, max_area, area_tol and the top_k selection
+        key = hashlib.sha256()
+        for data_ab in (data_ab_lower, data_ab_upper):
+            key.update(repr([row[0] for row in data_ab]).encode())
+            key.update(np.array([row[1:] for row in data_ab], dtype=float).tobytes())
+        key.update(repr((float(self.max_area), self.area_tol, top_k, self.match_metric if top_k is not None else None)).encode())
+        return key.hexdigest()
+
+    def load_matches(self, key, top_k=None):
+        matches_file = f'{self.output_dir}/{MATCHES_FILE}'
+        if not os.path.isfile(matches_file):
+            return None
+        try:
+            with np.load(matches_file, allow_pickle=False) as f:
+                # Tighter tolerances can be applied to the stored matches, looser ones need a new search
+                if str(f['key']) != key or self.uv_tol > float(f['uv_tol']) or self.angle_tol > float(f['angle_tol']):
+                    return None
+                # The best top_k matches are only complete for the tolerances they were searched with
+                if top_k is not None and (self.uv_tol, self.angle_tol) != (float(f['uv_tol']), float(f['angle_tol'])):
+                    return None
+                pairs, hkl, values = f['pairs'].tolist(), f['hkl'], f['values']
+        except Exception:
+            return None
+        return {tuple(pair): values[(hkl[:, 0] == pair[0]) & (hkl[:, 1] == pair[1])] for pair in pairs}
+
+    def save_matches(self, key, matches, top_k=None):
+        ''' Data format of values, one row per match before filtering:
+        0 - 18 - Columns of lattice_match
+        '''
+        hkl = np.array([pair for pair, values in matches.items() for _ in range(len(values))], dtype='U16').reshape(-1, 2)
+        values = np.concatenate([values for values in matches.values()]) if matches else np.zeros((0, MATCH_COLUMNS))
+        os.makedirs(self.output_dir, exist_ok=True)
+        np.savez(f'{self.output_dir}/{MATCHES_FILE}', key=key, uv_tol=self.uv_tol, angle_tol=self.angle_tol, pairs=np.array(list(matches), dtype='U16').reshape(-1, 2), hkl=hkl, values=values)
+
+    def run(self, metric=None, top_k=None):
+        lower_hkls, upper_hkls = [self.lower_hkl], [self.upper_hkl]
+
+        # print(f'\nAssigned Miller indices for lower slab: {lower_hkls}; upper slab: {upper_hkls}')
+
+        # Create slabs folder
+        if not os.path.exists(f'{self.output_dir}/slabs'):
+            os.makedirs(f'{self.output_dir}/slabs')
         else:
-            f.write('Warning: Shape filter is OFF! '.center(70) + '\n')
-            f.write('All matched interfaces will be kept!'.center(70) + '\n')
-        f.write('\n')
-        f.write('-'.center(70, '-') + '\n\n')
-        f.write(f'Search results for matched interfaces with area within {MAX_AREA} A^2: \n\n')
-        f.write(f'{"Lower hkl":<20}{"Upper hkl":<20}{"Area (A^2)":<20}\n')
+            shutil.rmtree(f'{self.output_dir}/slabs')
+            os.makedirs(f'{self.output_dir}/slabs')
+
+        # Search the candidate table, ranked by the metric if given
+        # print('\nFinding matched interfaces...')
+        candidates, summary = self.search(metric=metric)
+
+        # Create interfaces folder, the archive output mode writes all interfaces into two multi-frame files instead
+        # The outputs of the other format from an earlier run are removed, so that the output folder only holds this run
+        if self.output_format == 'vasp':
+            for archive in (INTERFACES_ARCHIVE, SLABS_ARCHIVE):
+                if os.path.exists(f'{self.output_dir}/{archive}'):
+                    os.remove(f'{self.output_dir}/{archive}')
+            if not os.path.exists(f'{self.output_dir}/interfaces'):
+                os.makedirs(f'{self.output_dir}/interfaces')
+            else:
+                shutil.rmtree(f'{self.output_dir}/interfaces')
+                os.makedirs(f'{self.output_dir}/interfaces')
+        elif os.path.exists(f'{self.output_dir}/interfaces'):
+            shutil.rmtree(f'{self.output_dir}/interfaces')
+
+        # Collect the log and csv lines and write them once at the end of the run
+        log_lines, csv_lines = [], []
+
+        log_lines.append('-'.center(70, '-') + '\n\n')
+        log_lines.append('Masgent - Interface Maker'.center(70) + '\n')
+        log_lines.append('-------------------------'.center(70) + '\n')
+        log_lines.append('Copyright (c) 2025 Guangchen Liu'.center(70) + '\n\n')
+        log_lines.append('Cite Us: https://doi.org/10.1016/j.mtphys.2025.101940'.center(70) + '\n\n')
+        log_lines.append(f'Aassigned Miller indices:'.center(70) + '\n')
+        log_lines.append(f'Lower slab: {lower_hkls[0]}'.center(70) + '\n')
+        log_lines.append(f'Upper slab: {upper_hkls[0]}'.center(70) + '\n')
+        log_lines.append('\n')
+        if self.shape_filter:
+            log_lines.append('Warning: Shape filter is ON! '.center(70) + '\n')
+            log_lines.append('Only the most square-like interface will be kept!'.center(70) + '\n')
+        else:
+            log_lines.append('Warning: Shape filter is OFF! '.center(70) + '\n')
+            log_lines.append('All matched interfaces will be kept!'.center(70) + '\n')
+        log_lines.append('\n')
+        log_lines.append('-'.center(70, '-') + '\n\n')
+        log_lines.append(f'Search results for matched interfaces with area within {self.max_area} A^2: \n\n')
+        log_lines.append(f'{"Lower hkl":<20}{"Upper hkl":<20}{"Area (A^2)":<20}\n')
     
-    with open(f'{OUTPUT_DIR}/interface_maker.csv', 'w') as f:
-        f.write('Interface ID,Surface ID,Total atoms,Lower hkl,Upper hkl,Lower area,Upper area,U misfit (%),V misfit (%),Angle misfit (°),Area misfit (%),T_0_1,T_0_2,T_0_3,T_0_4,T_1_1,T_1_2,T_1_3,T_1_4\n')
-
-    # Get the product of the Miller indices
-    # print('\nFinding matched interfaces...')
-    data_matched_all = []
-    for i, j in product(LOWER_HKL, UPPER_HKL):
-        LOWER_HKL = [i]
-        UPPER_HKL = [j]
-
-        # Get the slab data in data_ab_lower and data_ab_upper using the Miller indices
-        lower_hkl = f'{LOWER_HKL[0][0]}{LOWER_HKL[0][1]}{LOWER_HKL[0][2]}'
-        upper_hkl = f'{UPPER_HKL[0][0]}{UPPER_HKL[0][1]}{UPPER_HKL[0][2]}'
-        data_ab_lower_hkl = [i for i in data_ab_lower if i[0] == lower_hkl]
-        data_ab_upper_hkl = [i for i in data_ab_upper if i[0] == upper_hkl]
-
-        if len(data_ab_lower_hkl) == 1 and len(data_ab_upper_hkl) == 1:
-            # Match the lattices of the lower and upper slabs
-            while True:
-                data_pairs = pair_slabs(data_ab_lower_hkl, data_ab_upper_hkl, MAX_AREA)
-                data_matched = lattice_match(data_pairs, data_ab_lower_hkl, data_ab_upper_hkl)
-                if len(data_matched) == 0:
-                    with open(f'{OUTPUT_DIR}/interface_maker.log', 'a') as f:
-                        f.write(f'{str(LOWER_HKL[0]):<20}{str(UPPER_HKL[0]):<20}{"-":<20}{"0":<20}\n')
-                        # print('\n'.ljust(4) + f'---> No matched interfaces found for {LOWER_HKL[0]} and {UPPER_HKL[0]} within {MAX_AREA} A^2')
-                    break
-                else:
-                    data_matched, min_area = filter_data(data_matched, MIN_AREA)
-                    data_matched_all.extend(data_matched)
-                    with open(f'{OUTPUT_DIR}/interface_maker.log', 'a') as f:
-                        f.write(f'{str(LOWER_HKL[0]):<20}{str(UPPER_HKL[0]):<20}{min_area:<20.4f}\n')
-                        # print('\n'.ljust(4) + f'---> Found matched interfaces for {LOWER_HKL[0]} and {UPPER_HKL[0]} within {min_area:.4f} A^2')
-                    break
-
-    with open(f'{OUTPUT_DIR}/interface_maker.log', 'a') as f:
-        f.write(f'\nTotal number of interfaces found: {len(data_matched_all)}'.center(70) + '\n\n')
-        # print(f'\nTotal number of interfaces found: {len(data_matched_all)}')
+        csv_lines.append('Interface ID,Surface ID,Total atoms,Lower hkl,Upper hkl,Lower area,Upper area,U misfit (%),V misfit (%),Angle misfit (°),Area misfit (%),T_0_1,T_0_2,T_0_3,T_0_4,T_1_1,T_1_2,T_1_3,T_1_4\n')
+
+        for hkl_0, hkl_1, min_area in summary:
+            if min_area is None:
+                log_lines.append(f'{str(hkl_0):<20}{str(hkl_1):<20}{"-":<20}{"0":<20}\n')
+                # print('\n'.ljust(4) + f'---> No matched interfaces found for {hkl_0} and {hkl_1} within {self.max_area} A^2')
+            else:
+                log_lines.append(f'{str(hkl_0):<20}{str(hkl_1):<20}{min_area:<20.4f}\n')
+                # print('\n'.ljust(4) + f'---> Found matched interfaces for {hkl_0} and {hkl_1} within {min_area:.4f} A^2')
+
+        # The supercell count is only known when the lattices were matched again instead of reusing stored matches
+        n_trimmed_supercells = sum(self.trimmed_supercells.values()) if self.trimmed_supercells else '-'
+        log_lines.append(f'\nDuplicates removed by trim: {sum(self.trimmed_slabs.values())} slabs, {n_trimmed_supercells} supercells\n')
+        log_lines.append(f'\nTotal number of interfaces found: {len(candidates)}'.center(70) + '\n\n')
+        # print(f'\nTotal number of interfaces found: {len(candidates)}')
     
-    # Write the matched interfaces
-    if not len(data_matched_all) == 0:
+        # Write the matched interfaces, only the first top_k candidates if given
         # print('\n'.ljust(4) + '---> Creating interfaces...')
-        for i, profile in enumerate(data_matched_all):
-            gen_intf(i, profile)
+        archives = None
+        if self.output_format == 'extxyz':
+            archives = (open(f'{self.output_dir}/{INTERFACES_ARCHIVE}', 'w'), open(f'{self.output_dir}/{SLABS_ARCHIVE}', 'w'))
+        try:
+            for i, slabs, interfaces in self.iter_interfaces(candidates, top_k=top_k):
+                log_lines_intf, csv_lines_intf = self.gen_intf(i, candidates[i], slabs, interfaces, archives)
+                log_lines.extend(log_lines_intf)
+                csv_lines.extend(csv_lines_intf)
+        finally:
+            if archives is not None:
+                for f in archives:
+                    f.close()
         # print('\n'.ljust(4) + '---> All interfaces are created successfully!\n')
 
+        with open(f'{self.output_dir}/interface_maker.log', 'w') as f:
+            f.writelines(log_lines)
+
+        with open(f'{self.output_dir}/interface_maker.csv', 'w') as f:
+            f.writelines(csv_lines)
+
+        return candidates
+
+    def screen_pair(self, data_ab_lower_hkl, data_ab_upper_hkl):
+        hkl_0, hkl_1 = data_ab_lower_hkl[0], data_ab_upper_hkl[0]
+        data_pairs = pair_slabs([data_ab_lower_hkl], [data_ab_upper_hkl], self.max_area, self.area_tol)
+        data_matched = self.lattice_match(data_pairs, [data_ab_lower_hkl], [data_ab_upper_hkl])
+        if len(data_matched) == 0:
+            return [hkl_0, hkl_1, 0]
+
+        # Keep the smallest matched interface, then the one with the lowest u and v misfits
+        data_matched, min_area = self.filter_data(data_matched)
+        best = select_matches(data_matched, 1, 'area')[0]
+        area_0, area_1 = float(best[3]), float(best[4])
+
+        ''' Data format:
+        0 - Miller index hkl of lower slab
+        1 - Miller index hkl of upper slab
+        2 - Number of matched interfaces
+        3 - Area of lower slab
+        4 - Area of upper slab
+        5 - u_mis
+        6 - v_mis
+        7 - angle_mis
+        8 - Area misfit
+        '''
+        return [hkl_0, hkl_1, len(data_matched), area_0, area_1, float(best[0]), float(best[1]), float(best[2]), np.abs(area_0 - area_1) / area_0]
+
+    def screen(self, lower_hkl_max, upper_hkl_max, n_workers=None, symmetry_reduce=True):
+        # Create slabs folder
+        if not os.path.exists(f'{self.output_dir}/slabs'):
+            os.makedirs(f'{self.output_dir}/slabs')
+        else:
+            shutil.rmtree(f'{self.output_dir}/slabs')
+            os.makedirs(f'{self.output_dir}/slabs')
+
+        # Only build one slab per family of symmetry-equivalent Miller indices if requested
+        if symmetry_reduce:
+            lower_hkls = find_hkl_unique(self.lower_conv, *lower_hkl_max)
+            upper_hkls = find_hkl_unique(self.upper_conv, *upper_hkl_max)
+        else:
+            lower_hkls, upper_hkls = find_hkl(*lower_hkl_max), find_hkl(*upper_hkl_max)
+
+        # Create slabs for all the Miller indices up to the given maxima, identical slabs are only kept once
+        data_ab_lower, _ = self.slab_maker(cell_conv=self.lower_conv, miller_indices=lower_hkls, vacuum=self.slab_vacuum, layers=self.lower_slab_layers)
+        data_ab_upper, _ = self.slab_maker(cell_conv=self.upper_conv, miller_indices=upper_hkls, vacuum=self.slab_vacuum, layers=self.upper_slab_layers)
+        jobs = list(product(data_ab_lower, data_ab_upper))
+
+        # Search all the Miller index pairs serially, or in a process pool if more workers are requested and each one gets enough pairs
+        # The workers are spawned, so the pool does not fork the threads of the caller on any platform
+        n_workers = min(n_workers or 1, len(jobs) // SCREEN_JOBS_PER_WORKER)
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_screen_worker, initargs=(self,)) as executor:
+                results = list(executor.map(screen_pair_worker, jobs, chunksize=max(1, len(jobs) // (4 * n_workers))))
+        else:
+            results = [self.screen_pair(lower, upper) for lower, upper in jobs]
+
+        # Rank the matched pairs by the smallest interface area, then by the u and v misfits
+        matched = sorted([i for i in results if i[2] > 0], key=lambda x: (x[3], x[5] + x[6]))
+        unmatched = [i for i in results if i[2] == 0]
+
+        with open(f'{self.output_dir}/interface_screening.csv', 'w') as f:
+            f.write('Rank,Lower hkl,Upper hkl,Matched interfaces,Lower area,Upper area,U misfit (%),V misfit (%),Angle misfit (°),Area misfit (%)\n')
+            for rank, row in enumerate(matched):
+                f.write(f'{rank+1},{row[0]},{row[1]},{row[2]},{row[3]:.6f},{row[4]:.6f},{row[5]*100:.6f},{row[6]*100:.6f},{row[7]:.6f},{row[8]*100:.6f}\n')
+            for row in unmatched:
+                f.write(f'-,{row[0]},{row[1]},0,-,-,-,-,-,-\n')
+
+        return matched
+
+def init_screen_worker(maker):
+    # Keep the InterfaceMaker in the worker, so that the jobs only carry the slab data of their Miller index pair
+    global _screen_maker
+    _screen_maker = maker
+
+def screen_pair_worker(job):
+    # Module-level entry point so that the screening pool can pickle the job
+    return _screen_maker.screen_pair(*job)
+
+def read_archive_frame(path, index, **expected):
+    # Read a single frame of an archive and check that it is the requested one
+    try:
+        atoms = read(path, index=index, format='extxyz')
+    except (IndexError, StopIteration):
+        atoms = None
+    if atoms is None or any(atoms.info.get(key) != value for key, value in expected.items()):
+        raise ValueError(f'Frame {expected} not found in {path}')
+    return atoms
+
+def extract_interface(output_dir, interface_id, surface_id, output_path=None):
+    # Each interface has four frames in the archive, one per surface termination
+    atoms = read_archive_frame(f'{output_dir}/{INTERFACES_ARCHIVE}', (interface_id - 1) * 4 + surface_id - 1, interface_id=interface_id, surface_id=surface_id)
+    if output_path is not None:
+        write(output_path, atoms, format='vasp', direct=True, sort=True)
+    return atoms
+
+def extract_slab(output_dir, interface_id, slab_id, output_path=None):
+    # Each interface has two frames in the slab archive, slab 0 is the lower and slab 1 the upper one
+    atoms = read_archive_frame(f'{output_dir}/{SLABS_ARCHIVE}', (interface_id - 1) * 2 + slab_id, interface_id=interface_id, slab_id=slab_id)
+    if output_path is not None:
+        write(output_path, atoms, format='vasp', direct=True, sort=True)
+    return atoms
+
+def run_interface_maker(lower_conv, upper_conv, lower_hkl, upper_hkl, min_area, max_area, slab_vacuum, interface_gap, lower_slab_layers, upper_slab_layers, uv_tol, angle_tol, shape_filter, output_dir, area_tol=None, write_slabs=True, metric=None, top_k=None, slab_cache_dir=None, reuse_matches=True, output_format='vasp', match_top_k=None):
+    # The matches kept during the search are ranked by the same metric, which cannot be the atom count
+    if match_top_k is not None and metric == 'n_atoms':
+        raise ValueError(f'Unknown match metric: {metric}. Available metrics: {[i for i in CANDIDATE_METRICS if i != "n_atoms"]}')
+    maker = InterfaceMaker(
+        lower_conv=lower_conv,
+        upper_conv=upper_conv,
+        output_dir=output_dir,
+        lower_hkl=lower_hkl,
+        upper_hkl=upper_hkl,
+        min_area=min_area,
+        max_area=max_area,
+        slab_vacuum=slab_vacuum,
+        interface_gap=interface_gap,
+        lower_slab_layers=lower_slab_layers,
+        upper_slab_layers=upper_slab_layers,
+        uv_tol=uv_tol,
+        angle_tol=angle_tol,
+        area_tol=area_tol,
+        shape_filter=shape_filter,
+        write_slabs=write_slabs,
+        slab_cache_dir=slab_cache_dir,
+        reuse_matches=reuse_matches,
+        output_format=output_format,
+        match_top_k=match_top_k,
+        match_metric=metric if metric is not None and metric != 'n_atoms' else 'area',
+        )
+    return maker.run(metric=metric, top_k=top_k)
+
+def run_interface_screening(lower_conv, upper_conv, lower_hkl_max, upper_hkl_max, min_area, max_area, slab_vacuum, lower_slab_layers, upper_slab_layers, uv_tol, angle_tol, shape_filter, output_dir, area_tol=None, n_workers=None, slab_cache_dir=None, symmetry_reduce=True):
+    maker = InterfaceMaker(
+        lower_conv=lower_conv,
+        upper_conv=upper_conv,
+        output_dir=output_dir,
+        min_area=min_area,
+        max_area=max_area,
+        slab_vacuum=slab_vacuum,
+        lower_slab_layers=lower_slab_layers,
+        upper_slab_layers=upper_slab_layers,
+        uv_tol=uv_tol,
+        angle_tol=angle_tol,
+        area_tol=area_tol,
+        shape_filter=shape_filter,
+        slab_cache_dir=slab_cache_dir,
+        )
+    return maker.screen(lower_hkl_max, upper_hkl_max, n_workers=n_workers, symmetry_reduce=symmetry_reduce)
+
 if __name__ == '__main__':
     run_interface_maker(
         upper_conv=UPPER_CONV,
@@ -0,0 +1,101 @@
+# !/usr/bin/env python3
+
+import os, tempfile
+import numpy as np
+
+MD_CHECKPOINT = 'md_checkpoint.npz'
+
+class MDCheckpoint:
+    '''Periodically save the full state of an MD run, attach it to the dynamics after the trajectory and log observers.'''
+    def __init__(self, path, dyn, trajectory_writer=None, observables=None):
+        self.path = path
+        self.dyn = dyn
+        self.trajectory_writer = trajectory_writer
+        self.observables = observables
+
+    def __call__(self):
+        # The initial state needs no checkpoint, a run stopped before the first interval simply starts again
+        if self.dyn.nsteps > 0:
+            self.save()
+
+    def save(self):
+        '''Atomically replace the checkpoint with the current state of the dynamics.'''
+        atoms = self.dyn.atoms
+        state = {
+            'nsteps': self.dyn.nsteps,
+            'timestep': self.dyn.dt,
+            'numbers': atoms.get_atomic_numbers(),
+            'cell': np.array(atoms.cell),
+            'pbc': atoms.pbc,
+            'positions': atoms.get_positions(),
+            'momenta': atoms.get_momenta(),
+            }
+        # Nose-Hoover chain positions and momenta, the thermostat state of the integrator
+        thermostat = getattr(self.dyn, '_thermostat', None)
+        if thermostat is not None:
+            state['eta'] = thermostat._eta
+            state['p_eta'] = thermostat._p_eta
+        rng_name, rng_keys, rng_pos, rng_has_gauss, rng_gauss = np.random.get_state()
+        state.update({'rng_keys': rng_keys, 'rng_pos': rng_pos, 'rng_has_gauss': rng_has_gauss, 'rng_gauss': rng_gauss})
+        # The partial chunk of the trajectory is kept in the checkpoint instead of being flushed as a short shard
+        if self.trajectory_writer is not None:
+            state.update(self.trajectory_writer.get_state())
+        # The on-the-fly observables are continued on resume instead of restarting at the checkpoint
+        if self.observables is not None:
+            state.update(self.observables.get_state())
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **state)
+        os.replace(tmp_path, self.path)
+
+def load_md_checkpoint(path):
+    '''Read an MD checkpoint into a dict of arrays.'''
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+def restore_md_checkpoint(dyn, checkpoint):
+    '''Put the atoms, step count, thermostat and random state of a checkpoint back into freshly created dynamics.'''
+    atoms = dyn.atoms
+    if len(atoms) != len(checkpoint['numbers']) or (atoms.get_atomic_numbers() != checkpoint['numbers']).any():
+        raise ValueError('The MD checkpoint does not match the atoms of this run.')
+    if not np.isclose(dyn.dt, float(checkpoint['timestep'])):
+        raise ValueError('The MD checkpoint was written with a different timestep.')
+
+    atoms.set_cell(checkpoint['cell'])
+    atoms.set_positions(checkpoint['positions'])
+    atoms.set_momenta(checkpoint['momenta'])
+    dyn.nsteps = int(checkpoint['nsteps'])
+
+    # The integrator keeps its own copies of the positions and momenta between steps
+    if hasattr(dyn, '_q') and hasattr(dyn, '_p'):
+        dyn._q = atoms.get_positions()
+        dyn._p = atoms.get_momenta()
+    thermostat = getattr(dyn, '_thermostat', None)
+    if thermostat is not None and 'eta' in checkpoint:
+        thermostat._eta = checkpoint['eta'].copy()
+        thermostat._p_eta = checkpoint['p_eta'].copy()
+    np.random.set_state(('MT19937', checkpoint['rng_keys'], int(checkpoint['rng_pos']), int(checkpoint['rng_has_gauss']), float(checkpoint['rng_gauss'])))
+
+def truncate_md_log(logfile, n_records):
+    '''Keep the header and the first n_records lines of an MD log, dropping the ones written after the checkpoint.'''
+    with open(logfile, 'r') as f:
+        lines = f.readlines()
+    header = [line for line in lines if not line.strip() or not line.strip()[0].isdigit()][:1]
+    records = [line for line in lines if line.strip() and line.strip()[0].isdigit()]
+    with open(logfile, 'w') as f:
+        f.writelines(header + records[:n_records])
+
+def truncate_traj(trajectory_path, n_frames):
+    '''Keep the first n_frames of an ASE trajectory file, dropping the ones written after the checkpoint.'''
+    from ase.io import Trajectory
+    with Trajectory(trajectory_path) as traj:
+        if len(traj) <= n_frames:
+            return
+        frames = [traj[i] for i in range(n_frames)]
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(trajectory_path)), suffix='.traj')
+    os.close(fd)
+    with Trajectory(tmp_path, 'w') as traj:
+        for atoms in frames:
+            traj.write(atoms)
+    os.replace(tmp_path, trajectory_path)
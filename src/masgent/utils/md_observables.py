@@ -0,0 +1,177 @@
+# !/usr/bin/env python3
+
+import json
+import numpy as np
+from ase import units
+
+# 1 Å²/fs in cm²/s
+DIFFUSION_UNIT = 0.1
+
+class RunningStats:
+    '''Running mean and variance (Welford) of a scalar, with the least squares slope against time for the drift.'''
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+        self.sum_t, self.sum_tt, self.sum_x, self.sum_tx = 0.0, 0.0, 0.0, 0.0
+
+    def update(self, t, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        self.sum_t += t
+        self.sum_tt += t * t
+        self.sum_x += x
+        self.sum_tx += t * x
+
+    def std(self):
+        return float(np.sqrt(self.m2 / self.n)) if self.n > 0 else float('nan')
+
+    def slope(self):
+        denominator = self.n * self.sum_tt - self.sum_t ** 2
+        return (self.n * self.sum_tx - self.sum_t * self.sum_x) / denominator if self.n > 1 and denominator > 0 else float('nan')
+
+    def summary(self):
+        return {'mean': float(self.mean), 'std': self.std(), 'drift_per_ps': float(self.slope())}
+
+    def get_state(self):
+        return np.array([self.n, self.mean, self.m2, self.sum_t, self.sum_tt, self.sum_x, self.sum_tx])
+
+    def set_state(self, state):
+        self.n = int(state[0])
+        self.mean, self.m2, self.sum_t, self.sum_tt, self.sum_x, self.sum_tx = map(float, state[1:])
+
+class MDObservables:
+    '''Accumulate MSD per species, temperature and energy statistics and an optional RDF during MD, attach it to the dynamics every step.'''
+    def __init__(self, dyn, sample_interval=10, rdf_rmax=None, rdf_bins=200, rdf_interval=100):
+        self.dyn = dyn
+        self.atoms = dyn.atoms
+        self.sample_interval = sample_interval
+        self.rdf_interval = rdf_interval
+
+        # Unwrapped positions follow the minimum image displacement between two consecutive steps
+        self.masses = self.atoms.get_masses()
+        self.symbols = np.array(self.atoms.get_chemical_symbols())
+        self.species = sorted(set(self.symbols))
+        self.scaled = self.atoms.get_scaled_positions()
+        self.unwrapped = self.atoms.get_positions().copy()
+        self.reference = self.unwrapped.copy()
+        self.start_step = dyn.nsteps
+
+        self.times, self.msd = [], []
+        self.stats = {name: RunningStats() for name in ('temperature', 'potential_energy', 'kinetic_energy', 'total_energy')}
+
+        self.rdf_edges = np.linspace(0, rdf_rmax, rdf_bins + 1) if rdf_rmax else None
+        self.rdf_counts = np.zeros(rdf_bins) if rdf_rmax else None
+        self.rdf_frames, self.rdf_density = 0, 0.0
+
+    def __call__(self):
+        self.unwrap()
+        step = self.dyn.nsteps - self.start_step
+        if step % self.sample_interval == 0:
+            self.sample()
+        if self.rdf_edges is not None and step % self.rdf_interval == 0:
+            self.sample_rdf()
+
+    def unwrap(self):
+        scaled = self.atoms.get_scaled_positions()
+        delta = scaled - self.scaled
+        delta[:, self.atoms.pbc] -= np.round(delta[:, self.atoms.pbc])
+        self.unwrapped += delta @ np.array(self.atoms.cell)
+        self.scaled = scaled
+
+    def sample(self):
+        time_ps = self.dyn.get_time() / (1000 * units.fs)
+        # The center of mass drift is removed from the displacements
+        displacement = self.unwrapped - self.reference
+        displacement -= self.masses @ displacement / self.masses.sum()
+        squared = (displacement ** 2).sum(axis=1)
+        self.times.append(time_ps)
+        self.msd.append([squared[self.symbols == species].mean() for species in self.species])
+
+        n_atoms = len(self.atoms)
+        epot = self.atoms.get_potential_energy() / n_atoms
+        ekin = self.atoms.get_kinetic_energy() / n_atoms
+        for name, value in (('temperature', self.atoms.get_temperature()), ('potential_energy', epot), ('kinetic_energy', ekin), ('total_energy', epot + ekin)):
+            self.stats[name].update(time_ps, value)
+
+    def sample_rdf(self):
+        from ase.neighborlist import neighbor_list
+        distances = neighbor_list('d', self.atoms, self.rdf_edges[-1])
+        self.rdf_counts += np.histogram(distances, bins=self.rdf_edges)[0]
+        self.rdf_frames += 1
+        self.rdf_density += len(self.atoms) / self.atoms.get_volume()
+
+    def get_state(self):
+        '''Return the accumulated unwrapping, MSD, statistics and RDF, for a checkpoint of the run.'''
+        state = {
+            'observables_start_step': self.start_step,
+            'observables_scaled': self.scaled,
+            'observables_unwrapped': self.unwrapped,
+            'observables_reference': self.reference,
+            'observables_times': np.array(self.times),
+            'observables_msd': np.array(self.msd).reshape(-1, len(self.species)),
+            }
+        state.update({f'observables_stats_{name}': stats.get_state() for name, stats in self.stats.items()})
+        if self.rdf_counts is not None:
+            state.update({'observables_rdf_counts': self.rdf_counts, 'observables_rdf_frames': self.rdf_frames, 'observables_rdf_density': self.rdf_density})
+        return state
+
+    def set_state(self, state):
+        '''Continue the accumulation of a checkpoint, the RDF only if it was sampled with the same bins.'''
+        self.start_step = int(state['observables_start_step'])
+        self.scaled = state['observables_scaled'].copy()
+        self.unwrapped = state['observables_unwrapped'].copy()
+        self.reference = state['observables_reference'].copy()
+        self.times = state['observables_times'].tolist()
+        self.msd = state['observables_msd'].tolist()
+        for name, stats in self.stats.items():
+            stats.set_state(state[f'observables_stats_{name}'])
+        if self.rdf_counts is not None and 'observables_rdf_counts' in state and len(state['observables_rdf_counts']) == len(self.rdf_counts):
+            self.rdf_counts = state['observables_rdf_counts'].copy()
+            self.rdf_frames = int(state['observables_rdf_frames'])
+            self.rdf_density = float(state['observables_rdf_density'])
+
+    def diffusion_coefficients(self):
+        '''Einstein diffusion coefficient per species in cm²/s, from the MSD slope over the second half of the run.'''
+        times, msd = np.array(self.times), np.array(self.msd)
+        half = len(times) // 2
+        if len(times) - half < 2:
+            return {species: float('nan') for species in self.species}
+        slopes = np.polyfit(times[half:] * 1000, msd[half:], 1)[0]
+        return {species: float(slope / 6 * DIFFUSION_UNIT) for species, slope in zip(self.species, np.atleast_1d(slopes))}
+
+    def rdf(self):
+        '''Total radial distribution function g(r) averaged over the sampled frames.'''
+        r = (self.rdf_edges[1:] + self.rdf_edges[:-1]) / 2
+        shell_volumes = 4 / 3 * np.pi * (self.rdf_edges[1:] ** 3 - self.rdf_edges[:-1] ** 3)
+        density = self.rdf_density / self.rdf_frames
+        return r, self.rdf_counts / (self.rdf_frames * len(self.atoms) * density * shell_volumes)
+
+    def write(self, summary_path, msd_path, rdf_path=None):
+        '''Write the JSON summary, the MSD table and the RDF table if sampled.'''
+        summary = {
+            'start_step': int(self.start_step),
+            'end_step': int(self.dyn.nsteps),
+            'n_samples': len(self.times),
+            'temperature (K)': self.stats['temperature'].summary(),
+            'potential_energy (eV/atom)': self.stats['potential_energy'].summary(),
+            'kinetic_energy (eV/atom)': self.stats['kinetic_energy'].summary(),
+            'total_energy (eV/atom)': self.stats['total_energy'].summary(),
+            'final_msd (Å²)': dict(zip(self.species, map(float, self.msd[-1]))) if self.msd else {},
+            'diffusion_coefficient (cm²/s)': self.diffusion_coefficients(),
+            }
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+        with open(msd_path, 'w') as f:
+            f.write(','.join(['Time[ps]'] + [f'MSD_{species}[Å²]' for species in self.species]) + '\n')
+            for time_ps, values in zip(self.times, self.msd):
+                f.write(','.join([f'{time_ps:.6f}'] + [f'{value:.8f}' for value in values]) + '\n')
+
+        if rdf_path is not None and self.rdf_frames > 0:
+            r, g = self.rdf()
+            with open(rdf_path, 'w') as f:
+                f.write('r[Å],g(r)\n')
+                for r_i, g_i in zip(r, g):
+                    f.write(f'{r_i:.6f},{g_i:.8f}\n')
+        return summary
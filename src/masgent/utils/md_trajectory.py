@@ -0,0 +1,180 @@
+# !/usr/bin/env python3
+
+import os, json, tempfile
+import numpy as np
+from ase import units
+
+# A chunked trajectory is a directory of shards, one .npy file per field and chunk or one compressed .npz file per chunk
+TRAJECTORY_INDEX = 'index.json'
+TRAJECTORY_STATIC = 'static.npz'
+TRAJECTORY_FIELDS = ('positions', 'velocities', 'forces')
+# Per-frame scalars, the time in fs and the energies in eV
+FRAME_SCALARS = ('step', 'time', 'potential_energy', 'kinetic_energy')
+
+def write_index(directory, index):
+    '''Atomically replace the frame index of a chunked trajectory.'''
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, TRAJECTORY_INDEX))
+
+def read_index(directory):
+    with open(os.path.join(directory, TRAJECTORY_INDEX), 'r') as f:
+        return json.load(f)
+
+class ChunkedTrajectoryWriter:
+    '''Store MD frames in preallocated chunks of arrays, flushed to one shard per chunk, attach it to the dynamics as an observer.'''
+    def __init__(self, directory, atoms, dyn=None, fields=('positions',), dtype='float32', chunk_size=100, compress=False, append=False):
+        self.directory = directory
+        self.atoms = atoms
+        self.dyn = dyn
+        os.makedirs(directory, exist_ok=True)
+
+        if append and os.path.isfile(os.path.join(directory, TRAJECTORY_INDEX)):
+            # Continue the shards of an existing trajectory with its own layout
+            self.index = read_index(directory)
+            if self.index['n_atoms'] != len(atoms):
+                raise ValueError(f'Cannot append {len(atoms)} atoms to a trajectory of {self.index["n_atoms"]} atoms.')
+        else:
+            for name in os.listdir(directory):
+                if name.startswith('chunk_') or name in (TRAJECTORY_INDEX, TRAJECTORY_STATIC):
+                    os.remove(os.path.join(directory, name))
+            for field in fields:
+                if field not in TRAJECTORY_FIELDS:
+                    raise ValueError(f'Invalid trajectory field: {field}.')
+            if 'positions' not in fields:
+                raise ValueError('A trajectory must store the positions.')
+            self.index = {
+                'n_atoms': len(atoms),
+                'n_frames': 0,
+                'fields': list(fields),
+                'dtype': np.dtype(dtype).name,
+                'chunk_size': int(chunk_size),
+                'compress': bool(compress),
+                'shards': [],
+                }
+            np.savez(os.path.join(directory, TRAJECTORY_STATIC), numbers=atoms.get_atomic_numbers(), masses=atoms.get_masses(), cell=np.array(atoms.cell), pbc=atoms.pbc)
+            write_index(directory, self.index)
+
+        chunk_size, n_atoms = self.index['chunk_size'], self.index['n_atoms']
+        self.buffers = {field: np.empty((chunk_size, n_atoms, 3), dtype=self.index['dtype']) for field in self.index['fields']}
+        self.buffers.update({name: np.empty(chunk_size, dtype=np.float64) for name in FRAME_SCALARS})
+        self.n_buffered = 0
+
+    def __call__(self):
+        self.write()
+
+    def write(self, step=None):
+        '''Copy the current frame of the atoms into the chunk, flushing it when full.'''
+        atoms, i = self.atoms, self.n_buffered
+        if step is None:
+            step = self.dyn.nsteps if self.dyn is not None else self.index['n_frames'] + i
+        for field in self.index['fields']:
+            if field == 'positions':
+                self.buffers[field][i] = atoms.get_positions()
+            elif field == 'velocities':
+                self.buffers[field][i] = atoms.get_velocities()
+            else:
+                self.buffers[field][i] = atoms.get_forces()
+        self.buffers['step'][i] = step
+        self.buffers['time'][i] = step * self.dyn.dt / units.fs if self.dyn is not None else np.nan
+        self.buffers['potential_energy'][i] = atoms.get_potential_energy()
+        self.buffers['kinetic_energy'][i] = atoms.get_kinetic_energy()
+        self.n_buffered += 1
+        if self.n_buffered == self.index['chunk_size']:
+            self.flush()
+
+    def flush(self):
+        '''Save the buffered frames as a new shard and record it in the frame index.'''
+        if self.n_buffered == 0:
+            return
+        name = f'chunk_{len(self.index["shards"]):05d}'
+        arrays = {key: buffer[:self.n_buffered] for key, buffer in self.buffers.items()}
+        if self.index['compress']:
+            np.savez_compressed(os.path.join(self.directory, f'{name}.npz'), **arrays)
+        else:
+            for key, array in arrays.items():
+                np.save(os.path.join(self.directory, f'{name}_{key}.npy'), array)
+        # The index is only updated once the shard is complete, so that readers never see a partial chunk
+        self.index['shards'].append({'name': name, 'start': self.index['n_frames'], 'n_frames': self.n_buffered})
+        self.index['n_frames'] += self.n_buffered
+        write_index(self.directory, self.index)
+        self.n_buffered = 0
+
+    def truncate(self, n_frames):
+        '''Drop the shards written after the first n_frames, which must end on a shard boundary.'''
+        self.n_buffered = 0
+        keep = [shard for shard in self.index['shards'] if shard['start'] < n_frames]
+        n_kept = sum(shard['n_frames'] for shard in keep)
+        if n_kept < n_frames:
+            raise ValueError(f'Cannot keep {n_frames} frames, the trajectory only has {n_kept}.')
+        if n_kept != n_frames:
+            raise ValueError(f'Frame {n_frames} is not a shard boundary of the trajectory.')
+        for shard in self.index['shards'][len(keep):]:
+            for name in os.listdir(self.directory):
+                if name.startswith(f'{shard["name"]}.') or name.startswith(f'{shard["name"]}_'):
+                    os.remove(os.path.join(self.directory, name))
+        # The frame count follows the kept shards, so that the index never claims frames that were not written
+        self.index['shards'] = keep
+        self.index['n_frames'] = n_kept
+        write_index(self.directory, self.index)
+
+    def get_state(self):
+        '''Return the number of frames on disk and the buffered frames that are not, for a checkpoint of the run.'''
+        state = {'trajectory_n_frames': self.index['n_frames']}
+        state.update({f'trajectory_{key}': buffer[:self.n_buffered] for key, buffer in self.buffers.items()})
+        return state
+
+    def set_state(self, state):
+        '''Drop the shards written after a checkpoint and put its buffered frames back into the chunk.'''
+        self.truncate(int(state['trajectory_n_frames']))
+        n_buffered = len(state['trajectory_step'])
+        for key, buffer in self.buffers.items():
+            buffer[:n_buffered] = state[f'trajectory_{key}']
+        self.n_buffered = n_buffered
+
+    def close(self):
+        self.flush()
+
+class ChunkedTrajectoryReader:
+    '''Read time slices of a chunked trajectory, memory-mapping the uncompressed shards it touches.'''
+    def __init__(self, directory, mmap=True):
+        self.directory = directory
+        self.index = read_index(directory)
+        self.mmap_mode = 'r' if mmap and not self.index['compress'] else None
+        with np.load(os.path.join(directory, TRAJECTORY_STATIC)) as static:
+            self.numbers, self.masses, self.cell, self.pbc = static['numbers'], static['masses'], static['cell'], static['pbc']
+
+    def __len__(self):
+        return self.index['n_frames']
+
+    def load_shard(self, shard, key):
+        if self.index['compress']:
+            with np.load(os.path.join(self.directory, f'{shard["name"]}.npz')) as data:
+                return data[key]
+        return np.load(os.path.join(self.directory, f'{shard["name"]}_{key}.npy'), mmap_mode=self.mmap_mode)
+
+    def read(self, key, start=None, stop=None, step=None):
+        '''Return the frames start:stop:step of a field or per-frame scalar, only reading the shards in that range.'''
+        if key not in self.index['fields'] and key not in FRAME_SCALARS:
+            raise KeyError(f'Field not stored in this trajectory: {key}.')
+        frames = np.arange(len(self))[slice(start, stop, step)]
+        if key in self.index['fields']:
+            values = np.empty((len(frames), self.index['n_atoms'], 3), dtype=self.index['dtype'])
+        else:
+            values = np.empty(len(frames), dtype=np.float64)
+        for shard in self.index['shards']:
+            mask = (frames >= shard['start']) & (frames < shard['start'] + shard['n_frames'])
+            if mask.any():
+                values[mask] = self.load_shard(shard, key)[frames[mask] - shard['start']]
+        return values
+
+    def get_atoms(self, i):
+        '''Return frame i as Atoms.'''
+        from ase import Atoms
+        i = range(len(self))[i]
+        atoms = Atoms(numbers=self.numbers, positions=self.read('positions', i, i + 1)[0], cell=self.cell, pbc=self.pbc)
+        atoms.set_masses(self.masses)
+        if 'velocities' in self.index['fields']:
+            atoms.set_velocities(self.read('velocities', i, i + 1)[0])
+        return atoms
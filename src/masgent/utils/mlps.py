@@ -0,0 +1,457 @@
+# !/usr/bin/env python3
+
+import os, gc, csv, glob, time, tempfile, threading
+import numpy as np
+import multiprocessing
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from ase.optimize import LBFGS
+
+# Loaded MLP calculators are kept warm per (mlps_type, device, precision, compile) for the whole process
+MAX_CALCULATORS = 2
+MAX_CALCULATOR_MEMORY_GB = 8.0
+
+# MLPs whose models can evaluate a list of structures in one batched call, the others fall back to one call per structure
+BATCHED_MLPS = ('CHGNet',)
+
+# CPU performance profiles, the precision and compilation only apply to the MLPs that support them and None keeps the library default
+PERF_PROFILES = {
+    'default': {'threads': None, 'precision': None, 'compile': False},
+    'fast': {'threads': 'all', 'precision': 'float32', 'compile': True},
+    'accurate': {'threads': 'all', 'precision': 'float64', 'compile': False},
+    }
+# Precision names of each MLP that can change it, and MLPs that can compile their model
+MLPS_PRECISIONS = {'Orb-v3': {'float32': 'float32-high', 'float64': 'float64'}}
+COMPILE_MLPS = ('Orb-v3',)
+# Thread count variables of the OpenMP, MKL and OpenBLAS runtimes
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+# Largest strain between two states for which the LBFGS curvature history of one is reused for the other
+HESSIAN_REUSE_STRAIN = 0.05
+
+# Structure files picked up when screening a directory tree, extxyz archives are screened frame by frame
+STRUCTURE_PATTERNS = ('POSCAR*', 'CONTCAR*', '*.vasp', '*.extxyz')
+SCREENING_COLUMNS = ['structure', 'formula', 'n_atoms', 'energy', 'energy_per_atom', 'volume', 'max_force', 'steps', 'converged', 'error']
+
+_calculators = OrderedDict()
+_calculator_memory = {}
+_calculators_lock = threading.Lock()
+
+def build_calculator(mlps_type, device=None, precision=None, compile=False):
+    '''Load a new ASE calculator of the given MLP, None keeps the library default device and precision.'''
+    if compile and mlps_type not in COMPILE_MLPS:
+        raise ValueError(f'Model compilation is not supported by {mlps_type}.')
+    if mlps_type == 'SevenNet':
+        from sevenn.calculator import SevenNetCalculator
+        if precision is not None:
+            raise ValueError(f'Precision {precision} is not supported by {mlps_type}.')
+        return SevenNetCalculator(model='7net-0', device=device or 'auto')
+    elif mlps_type == 'CHGNet':
+        from chgnet.model.dynamics import CHGNetCalculator
+        if precision is not None:
+            raise ValueError(f'Precision {precision} is not supported by {mlps_type}.')
+        return CHGNetCalculator(use_device=device)
+    elif mlps_type == 'Orb-v3':
+        from orb_models.forcefield import pretrained
+        from orb_models.forcefield.calculator import ORBCalculator
+        orbff = pretrained.orb_v3_conservative_inf_omat(
+            device=device or 'cpu',
+            precision=precision or 'float32-high',   # or "float32-highest" / "float64"
+            compile=compile,
+            )
+        return ORBCalculator(orbff, device=device or 'cpu')
+    elif mlps_type == 'MatterSim':
+        from mattersim.forcefield import MatterSimCalculator
+        if precision is not None:
+            raise ValueError(f'Precision {precision} is not supported by {mlps_type}.')
+        return MatterSimCalculator() if device is None else MatterSimCalculator(device=device)
+    else:
+        raise ValueError(f'Invalid MLPs type: {mlps_type}.')
+
+def estimate_calculator_memory(calc):
+    '''Estimate the memory in bytes of a calculator from the parameters and buffers of its torch modules.'''
+    try:
+        import torch
+    except ImportError:
+        return 0
+
+    # The models are attributes of the calculators, or of their potential wrappers as in MatterSim
+    modules, objects = [], [calc]
+    for _ in range(3):
+        children = []
+        for obj in objects:
+            for value in getattr(obj, '__dict__', {}).values():
+                if isinstance(value, torch.nn.Module):
+                    modules.append(value)
+                elif hasattr(value, '__dict__') and not isinstance(value, type):
+                    children.append(value)
+        objects = children
+
+    tensors = {}
+    for module in modules:
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            tensors[tensor.data_ptr()] = tensor.numel() * tensor.element_size()
+    return sum(tensors.values())
+
+def get_calculator(mlps_type, device=None, precision=None, compile=False, max_calculators=None, max_memory_gb=None):
+    '''Return a warm calculator from the registry, loading it and evicting the least recently used ones if needed.'''
+    max_calculators = MAX_CALCULATORS if max_calculators is None else max_calculators
+    max_memory = (MAX_CALCULATOR_MEMORY_GB if max_memory_gb is None else max_memory_gb) * 1024 ** 3
+    key = (mlps_type, device, precision, compile)
+
+    with _calculators_lock:
+        if key in _calculators:
+            _calculators.move_to_end(key)
+            return _calculators[key]
+
+        calc = build_calculator(mlps_type, device=device, precision=precision, compile=compile)
+        _calculators[key] = calc
+        _calculator_memory[key] = estimate_calculator_memory(calc)
+
+        # The newest calculator is always kept, even if it exceeds the memory cap on its own
+        while len(_calculators) > 1 and (len(_calculators) > max_calculators or sum(_calculator_memory.values()) > max_memory):
+            evicted, _ = _calculators.popitem(last=False)
+            _calculator_memory.pop(evicted)
+            release_memory()
+
+        return calc
+
+def clear_calculators():
+    '''Drop all the calculators kept by the registry.'''
+    with _calculators_lock:
+        _calculators.clear()
+        _calculator_memory.clear()
+        release_memory()
+
+def cached_calculators():
+    '''List the (mlps_type, device, precision, compile) keys and estimated memory of the calculators in the registry.'''
+    with _calculators_lock:
+        return [(key, _calculator_memory[key]) for key in _calculators]
+
+def release_memory():
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+def predict_batch(calc, mlps_type, atoms_list, properties=('energy', 'forces')):
+    '''Evaluate the properties of all the structures, in one batched model call if the MLP supports it.'''
+    if mlps_type == 'CHGNet':
+        from ase import units
+        from pymatgen.io.ase import AseAtomsAdaptor
+        structures = [AseAtomsAdaptor.get_structure(atoms) for atoms in atoms_list]
+        task = 'efs' if 'stress' in properties else 'ef'
+        predictions = calc.model.predict_structure(structures, task=task, batch_size=len(structures))
+        if isinstance(predictions, dict):
+            predictions = [predictions]
+        results = []
+        for atoms, prediction in zip(atoms_list, predictions):
+            # CHGNet predicts the energy per atom and the stress in GPa
+            extensive_factor = len(atoms) if calc.model.is_intensive else 1
+            result = {'energy': float(prediction['e']) * extensive_factor, 'forces': np.asarray(prediction['f'], dtype=float)}
+            if 'stress' in properties:
+                result['stress'] = np.asarray(prediction['s'], dtype=float) * getattr(calc, 'stress_weight', units.GPa)
+            results.append(result)
+        return results
+
+    results = []
+    for atoms in atoms_list:
+        results.append({name: calc.get_property(name, atoms) for name in properties})
+    return results
+
+class WarmLBFGS(LBFGS):
+    '''LBFGS started from the curvature history of the relaxation of a neighboring state.'''
+    def __init__(self, atoms, history=None, **kwargs):
+        super().__init__(atoms, **kwargs)
+        # Newer ASE versions keep the history in a separate state object
+        if history is not None:
+            state = getattr(self, 'state', self)
+            state.s, state.y, state.rho = [list(values) for values in history]
+            state.iteration = len(state.s)
+
+    def update(self, pos, forces, r0, f0):
+        # No curvature pair is formed across two states, the first step only uses the inherited history
+        if r0 is not None:
+            super().update(pos, forces, r0, f0)
+
+    def history(self):
+        state = getattr(self, 'state', self)
+        return [np.copy(v) for v in state.s], [np.copy(v) for v in state.y], list(state.rho)
+
+def relax_continuation(atoms_list, calc, reference_cell, fmax=0.1, max_steps=500, logfiles=None, properties=('energy', 'forces')):
+    '''Relax the state closest to the reference cell first, then start every other state from its nearest relaxed neighbor.'''
+    from ase.calculators.singlepoint import SinglePointCalculator
+
+    logfiles = logfiles or [None] * len(atoms_list)
+    # Deformation of each cell relative to the reference one, cell = reference_cell @ strain
+    strains = [np.linalg.solve(reference_cell, np.array(atoms.cell)) for atoms in atoms_list]
+    def distance(i, j):
+        return np.abs(strains[i] - strains[j]).max()
+
+    first = min(range(len(atoms_list)), key=lambda i: np.abs(strains[i] - np.eye(3)).max())
+    pending = set(range(len(atoms_list))) - {first}
+    histories = {}
+    order = [(first, None)]
+    while order:
+        i, source = order.pop()
+        atoms = atoms_list[i]
+        history = None
+        if source is not None:
+            # Relaxed internal coordinates are carried over in fractional coordinates, the curvature history only between close states
+            atoms.set_scaled_positions(atoms_list[source].get_scaled_positions())
+            if distance(i, source) <= HESSIAN_REUSE_STRAIN:
+                history = histories[source]
+
+        atoms.calc = calc
+        opt = WarmLBFGS(atoms, history=history, logfile=logfiles[i])
+        opt.run(fmax=fmax, steps=max_steps)
+        histories[i] = opt.history()
+        opt.close()
+        atoms.calc = SinglePointCalculator(atoms, **{name: calc.get_property(name, atoms) for name in properties})
+
+        # Next is the pending state nearest to any relaxed one
+        if pending:
+            j, source = min(((j, k) for j in pending for k in histories), key=lambda pair: distance(*pair))
+            pending.remove(j)
+            order.append((j, source))
+
+def set_threads(n_threads):
+    '''Set the intra-op threads of torch, OpenMP and MKL, with one inter-op thread, and return the previous settings.'''
+    previous = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+    # The environment only takes effect if torch is not imported yet, as in fresh pool workers
+    for name in THREAD_VARIABLES:
+        os.environ[name] = str(n_threads)
+    try:
+        import torch
+        previous['torch'] = torch.get_num_threads()
+        torch.set_num_threads(n_threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        # The inter-op threads can no longer change once torch ran parallel work
+        pass
+    return previous
+
+def restore_threads(previous):
+    '''Put back the thread settings returned by set_threads.'''
+    for name in THREAD_VARIABLES:
+        if previous.get(name) is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = previous[name]
+    # The inter-op threads are left as they are, torch only allows setting them once
+    if 'torch' in previous:
+        import torch
+        torch.set_num_threads(previous['torch'])
+
+def resolve_profile(mlps_type, perf_profile, num_threads=None):
+    '''Return the calculator options and thread count of a performance profile, keeping only what the MLP supports.'''
+    profile = PERF_PROFILES[perf_profile]
+    threads = num_threads or ((os.cpu_count() or 1) if profile['threads'] == 'all' else None)
+    options = {}
+    if profile['precision'] is not None and mlps_type in MLPS_PRECISIONS:
+        options['precision'] = MLPS_PRECISIONS[mlps_type][profile['precision']]
+    if profile['compile'] and mlps_type in COMPILE_MLPS:
+        options['compile'] = True
+    return options, threads
+
+def measure_throughput(calc, atoms, n_evaluations=5):
+    '''Time single point energy and force evaluations of the structure after one warm-up evaluation.'''
+    atoms = atoms.copy()
+    atoms.calc = calc
+    positions = atoms.get_positions()
+    rng = np.random.default_rng(0)
+
+    # The warm-up evaluation includes the compilation of compiled models
+    start = time.perf_counter()
+    atoms.get_forces()
+    warmup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(n_evaluations):
+        # Slightly displaced positions, so that the calculator never returns cached results
+        atoms.set_positions(positions + rng.normal(scale=0.01, size=positions.shape))
+        atoms.get_forces()
+    elapsed = time.perf_counter() - start
+    return {
+        'warmup (s)': warmup,
+        'evaluations_per_s': n_evaluations / elapsed,
+        'atom_evaluations_per_s': n_evaluations * len(atoms) / elapsed,
+        }
+
+def init_worker(mlps_type, n_threads, calculator_options=None):
+    '''Pin the torch threads of a pool worker and load its calculator once.'''
+    set_threads(n_threads)
+    get_calculator(mlps_type, **(calculator_options or {}))
+
+def relax_worker(mlps_type, atoms, fmax, max_steps, logfile, properties, calculator_options=None):
+    '''Relax one structure in a pool worker and return it with its final results.'''
+    calc = get_calculator(mlps_type, **(calculator_options or {}))
+    # The results are kept as single point results, the MLP calculator itself is not sent back to the parent process
+    relax_structures([atoms], calc, mlps_type, fmax=fmax, max_steps=max_steps, logfiles=[logfile], properties=properties)
+    return atoms
+
+def relax_structures(atoms_list, calc, mlps_type, fmax=0.1, max_steps=500, logfiles=None, batch=False, properties=('energy', 'forces'), n_workers=1, threads_per_worker=None, calculator_options=None):
+    '''Relax the structures with one LBFGS each, one after another, all together with one batched evaluation per step, or over a process pool.'''
+    from ase.calculators.singlepoint import SinglePointCalculator
+
+    logfiles = logfiles or [None] * len(atoms_list)
+    n_workers = min(n_workers or 1, len(atoms_list))
+    if n_workers > 1:
+        # Spawned workers do not inherit the torch state of the parent, each one loads the model once in its initializer
+        threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker, initargs=(mlps_type, threads_per_worker, calculator_options)) as executor:
+            futures = [executor.submit(relax_worker, mlps_type, atoms, fmax, max_steps, logfile, properties, calculator_options) for atoms, logfile in zip(atoms_list, logfiles)]
+            for atoms, future in zip(atoms_list, futures):
+                relaxed = future.result()
+                atoms.positions = relaxed.positions
+                atoms.calc = relaxed.calc
+        return
+
+    if not batch:
+        for atoms, logfile in zip(atoms_list, logfiles):
+            atoms.calc = calc
+            opt = LBFGS(atoms, logfile=logfile)
+            opt.run(fmax=fmax, steps=max_steps)
+            # The shared calculator only caches the last structure, the final results of each one are kept with it
+            atoms.calc = SinglePointCalculator(atoms, **{name: calc.get_property(name, atoms) for name in properties})
+        return
+
+    # Same sequence as Optimizer.irun, but the optimizers are stepped together and the model is called once per step for all of them
+    opts = [LBFGS(atoms, logfile=logfile) for atoms, logfile in zip(atoms_list, logfiles)]
+    for opt in opts:
+        opt.fmax = fmax
+
+    def evaluate(indices):
+        atoms_batch = [atoms_list[i] for i in indices]
+        for atoms, result in zip(atoms_batch, predict_batch(calc, mlps_type, atoms_batch, properties)):
+            atoms.calc = SinglePointCalculator(atoms, **result)
+
+    active = list(range(len(atoms_list)))
+    evaluate(active)
+    for i in active:
+        opts[i].log(opts[i].optimizable.get_gradient())
+    active = [i for i in active if not opts[i].gradient_converged(opts[i].optimizable.get_gradient())]
+
+    while active:
+        for i in active:
+            opts[i].step()
+            opts[i].nsteps += 1
+        evaluate(active)
+        for i in active:
+            opts[i].log(opts[i].optimizable.get_gradient())
+        active = [i for i in active if opts[i].nsteps < max_steps and not opts[i].gradient_converged(opts[i].optimizable.get_gradient())]
+
+    for opt in opts:
+        opt.close()
+
+def find_structures(input_path, patterns=STRUCTURE_PATTERNS):
+    '''List the structure files under a directory, or matching a glob pattern, in a stable order.'''
+    if os.path.isdir(input_path):
+        paths = {str(path) for pattern in patterns for path in Path(input_path).rglob(pattern) if path.is_file()}
+    else:
+        paths = {path for path in glob.glob(input_path, recursive=True) if os.path.isfile(path)}
+    return sorted(paths)
+
+def iter_structures(paths):
+    '''Yield (structure_id, atoms, error) for every structure of the files, reading them one at a time.'''
+    from ase.io import read, iread
+    for path in paths:
+        try:
+            if path.endswith('.extxyz'):
+                for i, atoms in enumerate(iread(path, format='extxyz')):
+                    yield f'{path}@{i}', atoms, None
+            else:
+                yield path, read(path, format='vasp'), None
+        except Exception as e:
+            yield path, None, str(e)
+
+def structure_key(structure_id):
+    '''Key of a structure id by absolute path, keeping the frame index of archive frames.'''
+    path, sep, frame = structure_id.rpartition('@')
+    if sep and path.endswith('.extxyz') and frame.isdigit():
+        return f'{os.path.abspath(path)}@{frame}'
+    return os.path.abspath(structure_id)
+
+def read_screened(output_csv):
+    '''Return the keys of the structures screened successfully in a screening table, dropping the failed rows so that they are retried.'''
+    if not os.path.isfile(output_csv):
+        return set()
+    with open(output_csv, 'r', newline='') as f:
+        rows = list(csv.DictReader(f))
+    done = [row for row in rows if not row['error']]
+    if len(done) < len(rows):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_csv)), suffix='.csv')
+        with os.fdopen(fd, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=SCREENING_COLUMNS)
+            writer.writeheader()
+            writer.writerows(done)
+        os.replace(tmp_path, output_csv)
+    return {structure_key(row['structure']) for row in done}
+
+def screen_structures(paths, calc, output_csv, task_type='relax', fmax=0.1, max_steps=500, relax_cell=False, resume=True, archive_path=None, logfile=None):
+    '''Stream the structures through a single point or relaxation calculation and append one row per structure to the screening table.'''
+    from ase.io import write
+    from ase.filters import FrechetCellFilter
+    from ase.calculators.singlepoint import SinglePointCalculator
+
+    if not resume:
+        for path in (output_csv, archive_path):
+            if path is not None and os.path.isfile(path):
+                os.remove(path)
+    done = read_screened(output_csv)
+    n_screened, n_skipped, n_failed = 0, 0, 0
+
+    new_table = not os.path.isfile(output_csv) or os.path.getsize(output_csv) == 0
+    with open(output_csv, 'a', newline='') as f_csv, open(logfile or os.devnull, 'a') as f_log:
+        writer = csv.DictWriter(f_csv, fieldnames=SCREENING_COLUMNS)
+        if new_table:
+            writer.writeheader()
+
+        for structure_id, atoms, error in iter_structures(paths):
+            if structure_key(structure_id) in done:
+                n_skipped += 1
+                continue
+
+            row = {'structure': structure_id, 'error': error}
+            if atoms is not None:
+                try:
+                    atoms.calc = calc
+                    steps, converged = 0, None
+                    if task_type == 'relax':
+                        f_log.write(f'# {structure_id}\n')
+                        opt = LBFGS(FrechetCellFilter(atoms) if relax_cell else atoms, logfile=f_log)
+                        converged = bool(opt.run(fmax=fmax, steps=max_steps))
+                        steps = opt.nsteps
+                    energy = float(atoms.get_potential_energy())
+                    forces = atoms.get_forces()
+                    row.update({
+                        'formula': atoms.get_chemical_formula(),
+                        'n_atoms': len(atoms),
+                        'energy': f'{energy:.8f}',
+                        'energy_per_atom': f'{energy / len(atoms):.8f}',
+                        'volume': f'{atoms.get_volume():.8f}',
+                        'max_force': f'{np.sqrt((forces ** 2).sum(axis=1)).max():.8f}',
+                        'steps': steps,
+                        'converged': converged,
+                        })
+                    # The structure is archived before its row, so that an interrupted run never records a missing frame
+                    if archive_path is not None:
+                        frame = atoms.copy()
+                        frame.calc = SinglePointCalculator(frame, energy=energy, forces=forces)
+                        frame.info['structure'] = structure_id
+                        write(archive_path, frame, format='extxyz', append=True)
+                except Exception as e:
+                    row['error'] = str(e)
+
+            n_failed += row['error'] is not None
+            n_screened += 1
+            writer.writerow(row)
+            f_csv.flush()
+            if row['error'] is None:
+                done.add(structure_key(structure_id))
+
+    return n_screened, n_skipped, n_failed
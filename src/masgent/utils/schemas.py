@@ -1,6 +1,6 @@
 # !/usr/bin/env python3
 
-import os, re
+import os, re, glob, importlib.util
 import pandas as pd
 from ase.io import read
 from pymatgen.core import Structure
@@ -812,6 +812,36 @@ class GenerateInterfaceFromPoscars(BaseModel):
         description='If True, apply shape filtering to keep only the most square-like interfaces. If False, keep all matching interfaces. Defaults to False if not provided.'
     )
 
+    area_tolerance: Optional[float] = Field(
+        None,
+        description='If provided, search all supercell area ratios within this area misfit tolerance in percentage instead of only the successively closer ones. Defaults to None if not provided.'
+    )
+
+    ranking_metric: Optional[Literal['area', 'misfit', 'angle', 'area_mis', 'n_atoms']] = Field(
+        None,
+        description='If provided, rank the matched interfaces by this metric before writing them: smallest area, lowest u + v misfit, lowest angle misfit, lowest area misfit, or fewest atoms. Defaults to None (search order) if not provided.'
+    )
+
+    top_k: Optional[int] = Field(
+        None,
+        description='If provided, only write the first top_k matched interfaces after ranking. Defaults to None (all interfaces) if not provided.'
+    )
+
+    match_top_k: Optional[int] = Field(
+        None,
+        description="If provided and the shape filter is off, only keep the best match_top_k lattice matches of the Miller index pair during the search, ranked by ranking_metric or by area if no metric is given. Cannot be combined with the 'n_atoms' metric. Defaults to None (all matches) if not provided."
+    )
+
+    output_format: Literal['vasp', 'extxyz'] = Field(
+        'vasp',
+        description="Output format of the interfaces: 'vasp' writes one POSCAR per slab and interface, 'extxyz' writes all interfaces into one multi-frame file with the csv data stored per frame. Defaults to 'vasp' if not provided."
+    )
+
+    reuse_matches: bool = Field(
+        True,
+        description='If True, reuse the lattice matches stored by an earlier run on the same slabs when the tolerances are the same or tighter. If False, always match the lattices again. Defaults to True if not provided.'
+    )
+
     @model_validator(mode='after')
     def validator(self):
         # ensure lower POSCAR exists
@@ -871,8 +901,146 @@ class GenerateInterfaceFromPoscars(BaseModel):
         # validate angle_tolerance
         if self.angle_tolerance < 0:
             raise ValueError('Angle tolerance must be a non-negative number.')
+
+        # validate area_tolerance
+        if self.area_tolerance is not None and self.area_tolerance < 0:
+            raise ValueError('Area tolerance must be a non-negative number.')
+
+        # validate top_k
+        if self.top_k is not None and self.top_k < 1:
+            raise ValueError('Number of interfaces to write must be integer at least 1.')
+
+        # validate match_top_k, the atom counts are unknown while the lattices are matched
+        if self.match_top_k is not None and self.match_top_k < 1:
+            raise ValueError('Number of matches to keep must be integer at least 1.')
+        if self.match_top_k is not None and self.ranking_metric == 'n_atoms':
+            raise ValueError("The 'n_atoms' ranking metric cannot be combined with match_top_k.")
         
     
+class ScreenInterfacesFromPoscars(BaseModel):
+    '''
+    Schema for screening Miller index pairs of interfaces from two given POSCAR files.
+    '''
+
+    lower_poscar_path: str = Field(
+        ...,
+        description='Path to the lower POSCAR file. Must exist.'
+    )
+
+    upper_poscar_path: str = Field(
+        ...,
+        description='Path to the upper POSCAR file. Must exist.'
+    )
+
+    lower_hkl_max: List[int] = Field(
+        [1, 1, 1],
+        description='Maximum Miller indices [h_max, k_max, l_max] to screen for the lower structure surface. Defaults to [1, 1, 1] if not provided.'
+    )
+
+    upper_hkl_max: List[int] = Field(
+        [1, 1, 1],
+        description='Maximum Miller indices [h_max, k_max, l_max] to screen for the upper structure surface. Defaults to [1, 1, 1] if not provided.'
+    )
+
+    lower_slab_layers: int = Field(
+        4,
+        description='Number of atomic layers in the lower slab. Defaults to 4 if not provided.'
+    )
+
+    upper_slab_layers: int = Field(
+        4,
+        description='Number of atomic layers in the upper slab. Defaults to 4 if not provided.'
+    )
+
+    slab_vacuum: float = Field(
+        15.0,
+        description='Vacuum thickness in Angstroms. Defaults to 15.0 Å if not provided.'
+    )
+
+    min_area: float = Field(
+        50.0,
+        description='Minimum interface area in square Angstroms. Defaults to 50.0 Å² if not provided.'
+    )
+
+    max_area: float = Field(
+        500.0,
+        description='Maximum interface area in square Angstroms. Defaults to 500.0 Å² if not provided.'
+    )
+
+    uv_tolerance: float = Field(
+        5.0,
+        description='Tolerance for matching in-plane lattice vectors in percentage. Defaults to 5.0% if not provided.'
+    )
+
+    angle_tolerance: float = Field(
+        5.0,
+        description='Tolerance for angle matching between in-plane lattice vectors in degrees. Defaults to 5.0° if not provided.'
+    )
+
+    shape_filter: bool = Field(
+        False,
+        description='If True, only consider the most square-like interface of each Miller index pair. Defaults to False if not provided.'
+    )
+
+    area_tolerance: Optional[float] = Field(
+        None,
+        description='If provided, search all supercell area ratios within this area misfit tolerance in percentage instead of only the successively closer ones. Defaults to None if not provided.'
+    )
+
+    n_workers: Optional[int] = Field(
+        None,
+        description='Maximum number of worker processes for the screening, fewer are used so that each worker gets at least 500 Miller index pairs. Defaults to None (serial screening) if not provided.'
+    )
+
+    symmetry_reduce: bool = Field(
+        True,
+        description='If True, only screen one Miller index per family of symmetry-equivalent surfaces of each bulk structure. Defaults to True if not provided.'
+    )
+
+    @model_validator(mode='after')
+    def validator(self):
+        # ensure lower and upper POSCARs exist and are valid
+        for name, path in [('lower', self.lower_poscar_path), ('upper', self.upper_poscar_path)]:
+            if not os.path.isfile(path):
+                raise ValueError(f'{name.capitalize()} POSCAR file not found: {path}')
+            try:
+                _ = Structure.from_file(path)
+            except Exception as e:
+                raise ValueError(f'Invalid {name} POSCAR file: {path}')
+
+        # validate lower_hkl_max and upper_hkl_max
+        for name, hkl_max in [('lower', self.lower_hkl_max), ('upper', self.upper_hkl_max)]:
+            if len(hkl_max) != 3 or not all(isinstance(i, int) and i >= 0 for i in hkl_max) or not any(hkl_max):
+                raise ValueError(f'{name.capitalize()} maximum Miller indices must be a list of three non-negative integers [h_max, k_max, l_max], not all zero.')
+
+        # validate slab layers
+        if self.lower_slab_layers < 1 or self.upper_slab_layers < 1:
+            raise ValueError('Number of slab layers must be integer at least 1.')
+
+        # validate slab_vacuum
+        if self.slab_vacuum <= 0:
+            raise ValueError('Slab vacuum thickness must be a positive number.')
+
+        # validate min_area and max_area
+        if self.min_area <= 0 or self.max_area <= 0:
+            raise ValueError('Minimum and maximum interface area must be positive numbers.')
+        if self.min_area >= self.max_area:
+            raise ValueError('Minimum interface area must be less than maximum interface area.')
+
+        # validate tolerances
+        if self.uv_tolerance < 0:
+            raise ValueError('UV tolerance must be a non-negative number.')
+        if self.angle_tolerance < 0:
+            raise ValueError('Angle tolerance must be a non-negative number.')
+        if self.area_tolerance is not None and self.area_tolerance < 0:
+            raise ValueError('Area tolerance must be a non-negative number.')
+
+        # validate n_workers
+        if self.n_workers is not None and self.n_workers < 1:
+            raise ValueError('Number of workers must be at least 1.')
+
+        return self
+    
 class GenerateVaspWorkflowOfConvergenceTests(BaseModel):
     '''
     Schema for generating VASP input files and submit bash script for workflow of convergence tests for k-points and energy cutoff based on given POSCAR
@@ -1127,6 +1295,71 @@ class RunSimulationUsingMlps(BaseModel):
         description='Time step in femtoseconds for molecular dynamics simulations. Defaults to 5.0 fs if not provided.'
     )
 
+    batch_relax: bool = Field(
+        False,
+        description='Whether to relax all the EOS or elastic structures together, evaluating them in one batched MLP call per optimization step. Defaults to False if not provided.'
+    )
+
+    n_workers: int = Field(
+        1,
+        description='Number of worker processes to run the independent EOS or elastic relaxations in parallel, each worker loads the MLP once. Defaults to 1 (serial) if not provided.'
+    )
+
+    threads_per_worker: Optional[int] = Field(
+        None,
+        description='Number of torch threads pinned in each worker process. Defaults to the number of CPU cores divided by n_workers if not provided.'
+    )
+
+    warm_start: bool = Field(
+        False,
+        description='Whether to start each EOS or elastic relaxation from the relaxed coordinates and LBFGS history of its nearest relaxed neighbor. Defaults to False if not provided.'
+    )
+
+    trajectory_format: Literal['traj', 'npy', 'npz'] = Field(
+        'traj',
+        description='Format of the MD trajectory, an ASE .traj file, or chunked arrays in memory-mappable .npy shards or compressed .npz shards. Defaults to "traj" if not provided.'
+    )
+
+    trajectory_precision: Literal['float32', 'float64'] = Field(
+        'float32',
+        description='Precision of the arrays of chunked MD trajectories. Defaults to "float32" if not provided.'
+    )
+
+    trajectory_fields: List[str] = Field(
+        ['positions'],
+        description='Per-atom fields stored in chunked MD trajectories, among "positions", "velocities" and "forces". Defaults to ["positions"] if not provided.'
+    )
+
+    checkpoint_interval: int = Field(
+        100,
+        description='Number of MD steps between two checkpoints of the full MD state. Defaults to 100 if not provided.'
+    )
+
+    md_resume: bool = Field(
+        False,
+        description='Whether to continue an MD run from its last checkpoint up to md_steps in total, appending to its trajectory and log. Defaults to False if not provided.'
+    )
+
+    md_observables: bool = Field(
+        True,
+        description='Whether to accumulate MSD per species, temperature and energy statistics and drift, and diffusion coefficients during the MD run. Defaults to True if not provided.'
+    )
+
+    rdf_rmax: Optional[float] = Field(
+        None,
+        description='Cutoff radius in Å of the radial distribution function accumulated during the MD run, no RDF is computed if not provided.'
+    )
+
+    perf_profile: Optional[Literal['default', 'fast', 'accurate']] = Field(
+        None,
+        description='CPU performance profile of the MLP inference: "default" keeps the library defaults, "fast" uses all cores, float32 and model compilation, "accurate" uses all cores and float64. Precision and compilation only apply to the MLPs that support them. The throughput is reported if a profile is provided.'
+    )
+
+    num_threads: Optional[int] = Field(
+        None,
+        description='Number of torch intra-op threads, overriding the performance profile. Defaults to the profile or library default if not provided.'
+    )
+
     @model_validator(mode='after')
     def validator(self):
         # ensure POSCAR exists
@@ -1163,6 +1396,101 @@ class RunSimulationUsingMlps(BaseModel):
         # validate md_timestep
         if self.md_timestep <= 0:
             raise ValueError('Molecular dynamics time step (md_timestep) must be a positive number.')
+        
+        # validate n_workers and threads_per_worker
+        if self.n_workers < 1:
+            raise ValueError('Number of worker processes (n_workers) must be at least 1.')
+        
+        if self.threads_per_worker is not None and self.threads_per_worker < 1:
+            raise ValueError('Number of threads per worker (threads_per_worker) must be at least 1.')
+        
+        if self.batch_relax and self.n_workers > 1:
+            raise ValueError('Batched relaxation (batch_relax) cannot be combined with parallel workers (n_workers > 1).')
+        
+        if self.warm_start and (self.batch_relax or self.n_workers > 1):
+            raise ValueError('Warm-started relaxation (warm_start) runs one state after another, it cannot be combined with batch_relax or n_workers > 1.')
+        
+        # validate trajectory_fields
+        if 'positions' not in self.trajectory_fields or not all(field in ('positions', 'velocities', 'forces') for field in self.trajectory_fields):
+            raise ValueError('Trajectory fields must include "positions" and only contain "positions", "velocities" or "forces".')
+        
+        # validate checkpoint_interval, a multiple of the 10-step log interval so that checkpoints fall on logged frames
+        if self.checkpoint_interval < 10 or self.checkpoint_interval % 10 != 0:
+            raise ValueError('Checkpoint interval (checkpoint_interval) must be a positive multiple of 10 MD steps.')
+        
+        # validate rdf_rmax
+        if self.rdf_rmax is not None and self.rdf_rmax <= 0:
+            raise ValueError('RDF cutoff radius (rdf_rmax) must be a positive number.')
+        
+        # validate num_threads
+        if self.num_threads is not None and self.num_threads < 1:
+            raise ValueError('Number of threads (num_threads) must be at least 1.')
+
+        return self
+
+
+class ScreenStructuresUsingMlps(BaseModel):
+    '''
+    Schema for screening every structure in a directory tree or glob pattern using machine learning potentials (MLPs).
+    '''
+
+    input_path: str = Field(
+        ...,
+        description='Directory searched recursively for POSCAR, CONTCAR, .vasp and .extxyz files, or a glob pattern of structure files. Must match at least one file.'
+    )
+
+    mlps_type: Literal['SevenNet', 'CHGNet', 'Orb-v3', 'MatterSim'] = Field(
+        'CHGNet',
+        description='Type of machine learning potentials (MLPs) to use. Defaults to "CHGNet" if not provided.'
+    )
+
+    task_type: Literal['single', 'relax'] = Field(
+        'relax',
+        description='Type of calculation for every structure, single point or relaxation. Defaults to "relax" if not provided.'
+    )
+
+    fmax: float = Field(
+        0.1,
+        description='Maximum force convergence criterion in eV/Å. Defaults to 0.1 eV/Å if not provided.'
+    )
+
+    max_steps: int = Field(
+        500,
+        description='Maximum number of relaxation steps per structure. Defaults to 500 if not provided.'
+    )
+
+    relax_cell: bool = Field(
+        False,
+        description='Whether to also relax the cell shape and volume. Defaults to False if not provided.'
+    )
+
+    resume: bool = Field(
+        True,
+        description='Whether to skip the structures screened successfully in an earlier run, failed structures are screened again. Defaults to True if not provided.'
+    )
+
+    output_format: Literal['csv', 'parquet'] = Field(
+        'csv',
+        description='Format of the screening table, a Parquet table is exported from the incremental CSV table and needs pyarrow or fastparquet. Defaults to "csv" if not provided.'
+    )
+
+    @model_validator(mode='after')
+    def validator(self):
+        # ensure input_path is a directory or matches structure files
+        if not os.path.isdir(self.input_path) and not any(os.path.isfile(path) for path in glob.glob(self.input_path, recursive=True)):
+            raise ValueError(f'No directory or structure files found: {self.input_path}')
+
+        # validate fmax
+        if self.fmax <= 0:
+            raise ValueError('Maximum force convergence criterion (fmax) must be a positive number.')
+        
+        # validate max_steps
+        if self.max_steps < 1:
+            raise ValueError('Maximum number of relaxation steps (max_steps) must be at least 1.')
+
+        # ensure pandas has a Parquet engine, they are optional dependencies
+        if self.output_format == 'parquet' and not any(importlib.util.find_spec(engine) for engine in ('pyarrow', 'fastparquet')):
+            raise ValueError('Parquet output requires pyarrow or fastparquet, install one of them or use output_format="csv".')
 
         return self
 
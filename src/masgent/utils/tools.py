@@ -6,7 +6,7 @@ warnings.filterwarnings('ignore')
 
 import numpy as np
 import pandas as pd
-from typing import Literal, List
+from typing import Literal, List, Optional
 from pathlib import Path
 from dotenv import load_dotenv
 from ase.io import read, write
@@ -991,7 +991,7 @@ def generate_surface_slab_from_poscar(
     name='Generate interface from two POSCARs',
     description='Generate VASP POSCAR for interface from two given POSCAR files based on specified parameters',
     requires=['lower_poscar_path', 'upper_poscar_path', 'lower_hkl', 'upper_hkl'],
-    optional=['lower_slab_layers', 'upper_slab_layers', 'slab_vacuum', 'min_area', 'max_area', 'interface_gap', 'uv_tolerance', 'angle_tolerance', 'shape_filter'],
+    optional=['lower_slab_layers', 'upper_slab_layers', 'slab_vacuum', 'min_area', 'max_area', 'interface_gap', 'uv_tolerance', 'angle_tolerance', 'shape_filter', 'area_tolerance', 'ranking_metric', 'top_k', 'match_top_k', 'output_format', 'reuse_matches'],
     defaults={
         'lower_slab_layers': 4,
         'upper_slab_layers': 4,
@@ -1002,6 +1002,12 @@ def generate_surface_slab_from_poscar(
         'uv_tolerance': 5.0,
         'angle_tolerance': 5.0,
         'shape_filter': False,
+        'area_tolerance': None,
+        'ranking_metric': None,
+        'top_k': None,
+        'match_top_k': None,
+        'output_format': 'vasp',
+        'reuse_matches': True,
         },
     prereqs=[],
 ))
@@ -1019,6 +1025,12 @@ def generate_interface_from_poscars(
     uv_tolerance: float = 5.0,
     angle_tolerance: float = 5.0,
     shape_filter: bool = False,
+    area_tolerance: Optional[float] = None,
+    ranking_metric: Optional[str] = None,
+    top_k: Optional[int] = None,
+    match_top_k: Optional[int] = None,
+    output_format: str = 'vasp',
+    reuse_matches: bool = True,
 ) -> dict:
     '''
     Generate VASP POSCAR for interface from two given POSCAR files based on specified parameters
@@ -1040,6 +1052,12 @@ def generate_interface_from_poscars(
             uv_tolerance=uv_tolerance,
             angle_tolerance=angle_tolerance,
             shape_filter=shape_filter,
+            area_tolerance=area_tolerance,
+            ranking_metric=ranking_metric,
+            top_k=top_k,
+            match_top_k=match_top_k,
+            output_format=output_format,
+            reuse_matches=reuse_matches,
         )
     except Exception as e:
         return {
@@ -1054,7 +1072,7 @@ def generate_interface_from_poscars(
         os.makedirs(interfaces_dir, exist_ok=True)
 
         from masgent.utils.interface_maker import run_interface_maker
-        run_interface_maker(
+        candidates = run_interface_maker(
             lower_conv=lower_poscar_path,
             upper_conv=upper_poscar_path,
             lower_hkl=lower_hkl,
@@ -1069,11 +1087,27 @@ def generate_interface_from_poscars(
             angle_tol=angle_tolerance,
             shape_filter=shape_filter,
             output_dir=interfaces_dir,
+            area_tol=area_tolerance,
+            metric=ranking_metric,
+            top_k=top_k,
+            slab_cache_dir=os.path.join(os.path.dirname(runs_dir), 'slab_cache'),
+            reuse_matches=reuse_matches,
+            output_format=output_format,
+            match_top_k=match_top_k,
         )
 
+        n_written = len(candidates) if top_k is None else min(top_k, len(candidates))
+        if output_format == 'extxyz':
+            # Four frames per interface, one per surface termination
+            from masgent.utils.interface_maker import INTERFACES_ARCHIVE
+            return {
+                'status': 'success',
+                'message': f'Generated {n_written} of {len(candidates)} matched interfaces as {4 * n_written} frames in {os.path.join(interfaces_dir, INTERFACES_ARCHIVE)}.',
+                'interfaces_archive_path': os.path.join(interfaces_dir, INTERFACES_ARCHIVE),
+            }
         return {
             'status': 'success',
-            'message': f'Generated interface POSCAR(s) in {interfaces_dir}.',
+            'message': f'Generated {n_written} of {len(candidates)} matched interface POSCAR(s) in {interfaces_dir}.',
         }
     
     except Exception as e:
@@ -1081,6 +1115,123 @@ def generate_interface_from_poscars(
             'status': 'error',
             'message': f'Interface POSCAR generation failed: {str(e)}'
         }
+
+@with_metadata(schemas.ToolMetadata(
+    name='Screen Miller indices for interfaces from two POSCARs',
+    description='Screen all Miller index pairs up to given maximum h, k, l for the lower and upper materials in parallel and rank the lattice-matched interfaces',
+    requires=['lower_poscar_path', 'upper_poscar_path'],
+    optional=['lower_hkl_max', 'upper_hkl_max', 'lower_slab_layers', 'upper_slab_layers', 'slab_vacuum', 'min_area', 'max_area', 'uv_tolerance', 'angle_tolerance', 'shape_filter', 'area_tolerance', 'n_workers', 'symmetry_reduce'],
+    defaults={
+        'lower_hkl_max': [1, 1, 1],
+        'upper_hkl_max': [1, 1, 1],
+        'lower_slab_layers': 4,
+        'upper_slab_layers': 4,
+        'slab_vacuum': 15.0,
+        'min_area': 50.0,
+        'max_area': 500.0,
+        'uv_tolerance': 5.0,
+        'angle_tolerance': 5.0,
+        'shape_filter': False,
+        'area_tolerance': None,
+        'n_workers': None,
+        'symmetry_reduce': True,
+        },
+    prereqs=[],
+))
+def screen_interfaces_from_poscars(
+    lower_poscar_path: str,
+    upper_poscar_path: str,
+    lower_hkl_max: List[int] = [1, 1, 1],
+    upper_hkl_max: List[int] = [1, 1, 1],
+    lower_slab_layers: int = 4,
+    upper_slab_layers: int = 4,
+    slab_vacuum: float = 15.0,
+    min_area: float = 50.0,
+    max_area: float = 500.0,
+    uv_tolerance: float = 5.0,
+    angle_tolerance: float = 5.0,
+    shape_filter: bool = False,
+    area_tolerance: Optional[float] = None,
+    n_workers: Optional[int] = None,
+    symmetry_reduce: bool = True,
+) -> dict:
+    '''
+    Screen all Miller index pairs up to given maximum h, k, l for the lower and upper materials in parallel and rank the lattice-matched interfaces
+    '''
+    try:
+        schemas.ScreenInterfacesFromPoscars(
+            lower_poscar_path=lower_poscar_path,
+            upper_poscar_path=upper_poscar_path,
+            lower_hkl_max=lower_hkl_max,
+            upper_hkl_max=upper_hkl_max,
+            lower_slab_layers=lower_slab_layers,
+            upper_slab_layers=upper_slab_layers,
+            slab_vacuum=slab_vacuum,
+            min_area=min_area,
+            max_area=max_area,
+            uv_tolerance=uv_tolerance,
+            angle_tolerance=angle_tolerance,
+            shape_filter=shape_filter,
+            area_tolerance=area_tolerance,
+            n_workers=n_workers,
+            symmetry_reduce=symmetry_reduce,
+        )
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': f'Invalid input parameters: {str(e)}'
+        }
+
+    try:
+        runs_dir = os.environ.get('MASGENT_SESSION_RUNS_DIR')
+
+        screening_dir = os.path.join(runs_dir, 'interface_screening')
+        os.makedirs(screening_dir, exist_ok=True)
+
+        from masgent.utils.interface_maker import run_interface_screening
+        matched = run_interface_screening(
+            lower_conv=lower_poscar_path,
+            upper_conv=upper_poscar_path,
+            lower_hkl_max=lower_hkl_max,
+            upper_hkl_max=upper_hkl_max,
+            min_area=min_area,
+            max_area=max_area,
+            slab_vacuum=slab_vacuum,
+            lower_slab_layers=lower_slab_layers,
+            upper_slab_layers=upper_slab_layers,
+            uv_tol=uv_tolerance,
+            angle_tol=angle_tolerance,
+            shape_filter=shape_filter,
+            output_dir=screening_dir,
+            area_tol=area_tolerance,
+            n_workers=n_workers,
+            slab_cache_dir=os.path.join(os.path.dirname(runs_dir), 'slab_cache'),
+            symmetry_reduce=symmetry_reduce,
+        )
+
+        best_pairs = [{
+            'lower_hkl': row[0],
+            'upper_hkl': row[1],
+            'matched_interfaces': row[2],
+            'interface_area (Å²)': round(row[3], 4),
+            'u_misfit (%)': round(row[5] * 100, 4),
+            'v_misfit (%)': round(row[6] * 100, 4),
+            'angle_misfit (°)': round(row[7], 4),
+        } for row in matched[:5]]
+
+        return {
+            'status': 'success',
+            'message': f'Screened interfaces and found {len(matched)} matched Miller index pair(s) in {screening_dir}.',
+            'screening_csv_path': os.path.join(screening_dir, 'interface_screening.csv'),
+            'best_pairs': best_pairs,
+        }
+
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': f'Interface screening failed: {str(e)}'
+        }
+
 @with_metadata(schemas.ToolMetadata(
     name='Visualize Structure from POSCAR',
     description='Visualize structure from POSCAR using 3Dmol.js',
@@ -2126,7 +2277,7 @@ def analyze_vasp_workflow_of_neb(
     name='Run simulation using machine learning potentials (MLPs)',
     description='Run simulation using machine learning potentials (MLPs) based on given POSCAR. Supported tasks include: single point calculation, equation of state (EOS), elastic constants, and molecular dynamics (MD) simulations.',
     requires=[],
-    optional=['poscar_path', 'mlps_type', 'task_type', 'fmax', 'max_steps', 'scale_factors', 'temperature', 'md_steps', 'md_timestep'],
+    optional=['poscar_path', 'mlps_type', 'task_type', 'fmax', 'max_steps', 'scale_factors', 'temperature', 'md_steps', 'md_timestep', 'batch_relax', 'n_workers', 'threads_per_worker', 'warm_start', 'trajectory_format', 'trajectory_precision', 'trajectory_fields', 'checkpoint_interval', 'md_resume', 'md_observables', 'rdf_rmax', 'perf_profile', 'num_threads'],
     defaults={
         'poscar_path': f'{os.environ.get("MASGENT_SESSION_RUNS_DIR")}/POSCAR',
         'mlps_type': 'CHGNet',
@@ -2137,6 +2288,19 @@ def analyze_vasp_workflow_of_neb(
         'temperature': 1000,
         'md_steps': 1000,
         'md_timestep': 5.0,
+        'batch_relax': False,
+        'n_workers': 1,
+        'threads_per_worker': None,
+        'warm_start': False,
+        'trajectory_format': 'traj',
+        'trajectory_precision': 'float32',
+        'trajectory_fields': ['positions'],
+        'checkpoint_interval': 100,
+        'md_resume': False,
+        'md_observables': True,
+        'rdf_rmax': None,
+        'perf_profile': None,
+        'num_threads': None,
         },
     prereqs=[],
 ))
@@ -2150,6 +2314,19 @@ def run_simulation_using_mlps(
     temperature: int = 1000,
     md_steps: int = 1000,
     md_timestep: float = 5.0,
+    batch_relax: bool = False,
+    n_workers: int = 1,
+    threads_per_worker: Optional[int] = None,
+    warm_start: bool = False,
+    trajectory_format: Literal['traj', 'npy', 'npz'] = 'traj',
+    trajectory_precision: Literal['float32', 'float64'] = 'float32',
+    trajectory_fields: List[str] = ['positions'],
+    checkpoint_interval: int = 100,
+    md_resume: bool = False,
+    md_observables: bool = True,
+    rdf_rmax: Optional[float] = None,
+    perf_profile: Optional[Literal['default', 'fast', 'accurate']] = None,
+    num_threads: Optional[int] = None,
 ) -> dict:
     '''
     Run simulation using machine learning potentials (MLPs) based on given POSCAR.
@@ -2243,6 +2420,19 @@ def run_simulation_using_mlps(
             fmax=fmax,
             max_steps=max_steps,
             task_type=task_type,
+            batch_relax=batch_relax,
+            n_workers=n_workers,
+            threads_per_worker=threads_per_worker,
+            warm_start=warm_start,
+            trajectory_format=trajectory_format,
+            trajectory_precision=trajectory_precision,
+            trajectory_fields=trajectory_fields,
+            checkpoint_interval=checkpoint_interval,
+            md_resume=md_resume,
+            md_observables=md_observables,
+            rdf_rmax=rdf_rmax,
+            perf_profile=perf_profile,
+            num_threads=num_threads,
         )
     except Exception as e:
         return {
@@ -2250,34 +2440,43 @@ def run_simulation_using_mlps(
             'message': f'Invalid input parameters: {str(e)}'
         }
 
+    # The thread settings of a performance profile only hold for this task, the previous ones are restored at the end
+    previous_threads = None
     try:
         runs_dir = os.environ.get('MASGENT_SESSION_RUNS_DIR')
         
         mlps_simulation_dir = os.path.join(runs_dir, f'mlps_simulation/{mlps_type}')
         os.makedirs(mlps_simulation_dir, exist_ok=True)
 
-        if mlps_type == 'SevenNet':
-            from sevenn.calculator import SevenNetCalculator
-            calc = SevenNetCalculator(model='7net-0')
-        elif mlps_type == 'CHGNet':
-            from chgnet.model.dynamics import CHGNetCalculator
-            calc = CHGNetCalculator()
-        elif mlps_type == 'Orb-v3':
-            from orb_models.forcefield import pretrained
-            from orb_models.forcefield.calculator import ORBCalculator
-            orbff = pretrained.orb_v3_conservative_inf_omat(
-            device='cpu',
-            precision="float32-high",   # or "float32-highest" / "float64
-            )
-            calc = ORBCalculator(orbff, device='cpu')
-        elif mlps_type == 'MatterSim':
-            from mattersim.forcefield import MatterSimCalculator
-            calc = MatterSimCalculator()
-        else:
+        # Reuse the warm calculator of this MLP if an earlier call in this process loaded it, parallel EOS and elastic tasks load it in their workers instead
+        from masgent.utils.mlps import get_calculator, relax_structures, relax_continuation, resolve_profile, set_threads, restore_threads, measure_throughput
+        # A performance profile sets the threads, precision and compilation of the calculator where the MLP supports them
+        calculator_options, threads = resolve_profile(mlps_type, perf_profile or 'default', num_threads)
+        if threads is not None:
+            previous_threads = set_threads(threads)
+        try:
+            calc = None if n_workers > 1 and task_type in ('eos', 'elastic') else get_calculator(mlps_type, **calculator_options)
+        except ValueError as e:
             return {
                 'status': 'error',
-                'message': f'Invalid MLPs type: {mlps_type}.'
+                'message': str(e)
             }
+
+        # The throughput of the profile is measured on the input structure, parallel tasks only load the model in their workers
+        throughput = None
+        if perf_profile is not None and calc is not None:
+            throughput = measure_throughput(calc, read(poscar_path, format='vasp'))
+
+        def with_throughput(result):
+            if perf_profile is None:
+                return result
+            result['perf_profile'] = {'profile': perf_profile, 'threads': threads, **calculator_options}
+            if throughput is not None:
+                result['message'] += f' Throughput with the {perf_profile} profile: {throughput["evaluations_per_s"]:.2f} evaluations/s ({throughput["atom_evaluations_per_s"]:.1f} atoms/s).'
+                result['throughput'] = throughput
+            else:
+                result['message'] += f' Throughput of the {perf_profile} profile was not measured, the calculators only ran in the {n_workers} worker processes.'
+            return result
         
         from ase.filters import FrechetCellFilter
         from ase.optimize import LBFGS
@@ -2295,19 +2494,20 @@ def run_simulation_using_mlps(
             write_comments(f'{task_dir}/CONTCAR', 'poscar', comments)
             total_energy = atoms.get_potential_energy()
             energy_per_atom = total_energy / len(atoms)
-            return {
+            return with_throughput({
                 'status': 'success',
                 'message': f'Completed simulation using {mlps_type} in {mlps_simulation_dir}.',
                 'simulation_log_path': f'{task_dir}/masgent_mlps_single.log',
                 'contcar_path': f'{task_dir}/CONTCAR',
                 'total_energy (eV)': float(total_energy),
                 'energy_per_atom (eV/atom)': float(energy_per_atom),
-            }
+            })
         elif task_type == 'eos':
             task_dir = os.path.join(mlps_simulation_dir, 'eos')
             os.makedirs(task_dir, exist_ok=True)
             structure = Structure.from_file(poscar_path)
             scales, structures, volumes, energies = [], [], [], []
+            atoms_list, logfiles = [], []
             for scale in scale_factors:
                 scales.append(scale)
                 # Create scaled structure
@@ -2318,12 +2518,15 @@ def run_simulation_using_mlps(
                 comments = f'# Generated by Masgent for EOS calculation with scale factor = {scale:.3f} using {mlps_type}.'
                 write_comments(scaled_structure_path, 'poscar', comments)
                 structures.append(scaled_structure)
-                # Load scaled structure and perform optimization
-                atoms = read(scaled_structure_path, format='vasp')
-                atoms.calc = calc
-                # opt = LBFGS(FrechetCellFilter(atoms), logfile=f'{task_dir}/masgent_mlps_eos_{scale:.3f}.log')
-                opt = LBFGS(atoms, logfile=f'{task_dir}/masgent_mlps_eos_{scale:.3f}.log')
-                opt.run(fmax=fmax, steps=max_steps)
+                # Load scaled structure for optimization
+                atoms_list.append(read(scaled_structure_path, format='vasp'))
+                logfiles.append(f'{task_dir}/masgent_mlps_eos_{scale:.3f}.log')
+            # Relax the scaled structures, each one from its nearest relaxed neighbor, together with one batched evaluation per step or over a process pool if requested
+            if warm_start:
+                relax_continuation(atoms_list, calc, structure.lattice.matrix, fmax=fmax, max_steps=max_steps, logfiles=logfiles)
+            else:
+                relax_structures(atoms_list, calc, mlps_type, fmax=fmax, max_steps=max_steps, logfiles=logfiles, batch=batch_relax, n_workers=n_workers, threads_per_worker=threads_per_worker, calculator_options=calculator_options)
+            for scale, atoms in zip(scale_factors, atoms_list):
                 atoms.write(f'{task_dir}/CONTCAR_{scale:.3f}', format='vasp', direct=True, sort=True)
                 comments = f'# Generated by Masgent from simulation using {mlps_type} with fmax = {fmax} eV/Å.'
                 write_comments(f'{task_dir}/CONTCAR_{scale:.3f}', 'poscar', comments)
@@ -2334,12 +2537,12 @@ def run_simulation_using_mlps(
             pd.DataFrame({'Scale Factor': scale_factors, 'Volume (Å³)': volumes, 'Energy (eV/atom)': energies}).to_csv(f'{task_dir}/eos_cal.csv', index=False, float_format='%.8f')
             # Fit and plot EOS
             fit_and_plot_eos(scales, structures, volumes, energies, mlps_type, task_dir)
-            return {
+            return with_throughput({
                 'status': 'success',
                 'message': f'Completed EOS simulation using {mlps_type} in {mlps_simulation_dir}.',
                 'eos_cal_csv_path': f'{task_dir}/eos_cal.csv',
                 'eos_curve_png_path': f'{task_dir}/eos_curve.png',
-            }
+            })
         elif task_type == 'elastic':
             from pymatgen.analysis.elasticity.strain import Strain
             from pymatgen.analysis.elasticity.stress import Stress
@@ -2350,6 +2553,7 @@ def run_simulation_using_mlps(
             structure = Structure.from_file(poscar_path)
             D_all = create_deformation_matrices()
             strains, stresses = [], []
+            folder_names, atoms_list, logfiles = [], [], []
             for D_dict in D_all:
                 folder_name = list(D_dict.keys())[0]
                 D = D_dict[folder_name]
@@ -2362,19 +2566,23 @@ def run_simulation_using_mlps(
                 deformed_structure.to_ase_atoms().write(deformed_structure_path, format='vasp', direct=True, sort=True)
                 comments = f'# Generated by Masgent for elastic constants calculation with deformation {folder_name} using {mlps_type}.'
                 write_comments(deformed_structure_path, 'poscar', comments)
-                # Load deformed structure and perform optimization
-                atoms = read(deformed_structure_path, format='vasp')
-                atoms.calc = calc
-                # opt = LBFGS(FrechetCellFilter(atoms), logfile=f'{task_dir}/masgent_mlps_elastic_{folder_name}.log')
-                opt = LBFGS(atoms, logfile=f'{task_dir}/masgent_mlps_elastic_{folder_name}.log')
-                opt.run(fmax=fmax, steps=max_steps)
+                # Load deformed structure for optimization
+                folder_names.append(folder_name)
+                atoms_list.append(read(deformed_structure_path, format='vasp'))
+                logfiles.append(f'{task_dir}/masgent_mlps_elastic_{folder_name}.log')
+                strains.append(D)
+            # Relax the deformed structures, each one from its nearest relaxed neighbor, together with one batched evaluation per step or over a process pool if requested
+            if warm_start:
+                relax_continuation(atoms_list, calc, structure.lattice.matrix, fmax=fmax, max_steps=max_steps, logfiles=logfiles, properties=('energy', 'forces', 'stress'))
+            else:
+                relax_structures(atoms_list, calc, mlps_type, fmax=fmax, max_steps=max_steps, logfiles=logfiles, batch=batch_relax, properties=('energy', 'forces', 'stress'), n_workers=n_workers, threads_per_worker=threads_per_worker, calculator_options=calculator_options)
+            for folder_name, atoms in zip(folder_names, atoms_list):
                 atoms.write(f'{task_dir}/CONTCAR_{folder_name}', format='vasp', direct=True, sort=True)
                 comments = f'# Generated by Masgent from simulation using {mlps_type} with fmax = {fmax} eV/Å.'
                 write_comments(f'{task_dir}/CONTCAR_{folder_name}', 'poscar', comments)
                 stress = atoms.get_stress(voigt=True)  # in eV/Å³
                 stress_gpa = stress * 160.21766208  # convert to GPa
                 stresses.append(stress_gpa)
-                strains.append(D)
             eq_stress = Stress.from_voigt(stresses[0])
             strains = strains[1:]
             stresses = stresses[1:]
@@ -2402,11 +2610,11 @@ def run_simulation_using_mlps(
                 f.write(f'\nShear Modulus (Voigt):\t\t{G_V:.2f}')
                 f.write(f'\nShear Modulus (Reuss):\t\t{G_R:.2f}')
                 f.write(f'\nShear Modulus (Hill):\t\t{G_H:.2f}')
-            return {
+            return with_throughput({
                 'status': 'success',
                 'message': f'Completed elastic constants simulation using {mlps_type} in {mlps_simulation_dir}.',
                 'elastic_constants_path': f'{task_dir}/elastic_constants.txt',
-            }
+            })
         elif task_type == 'md':
             from ase import units
             from ase.md.velocitydistribution import MaxwellBoltzmannDistribution, Stationary
@@ -2415,37 +2623,109 @@ def run_simulation_using_mlps(
 
             task_dir = os.path.join(mlps_simulation_dir, 'md')
             os.makedirs(task_dir, exist_ok=True)
+            from masgent.utils.md_checkpoint import MD_CHECKPOINT, MDCheckpoint, load_md_checkpoint, restore_md_checkpoint, truncate_md_log, truncate_traj
+            checkpoint_path = os.path.join(task_dir, MD_CHECKPOINT)
+            logfile = f'{task_dir}/masgent_mlps_md.log'
+            trajectory_path = f'{task_dir}/masgent_mlps_md.traj' if trajectory_format == 'traj' else f'{task_dir}/masgent_mlps_md_trajectory'
+            resume = md_resume and os.path.isfile(checkpoint_path)
+
+            # Outputs written after the last checkpoint are dropped, the log and trajectory frames are recorded every 10 steps from step 0
+            checkpoint = None
+            if resume:
+                checkpoint = load_md_checkpoint(checkpoint_path)
+                # A chunked trajectory is continued from the frames recorded in the checkpoint, which must all be on disk
+                # The checkpoint is checked before any output is truncated, so that a refused resume leaves the run as it was
+                if trajectory_format != 'traj':
+                    from masgent.utils.md_trajectory import TRAJECTORY_INDEX, read_index
+                    if 'trajectory_n_frames' not in checkpoint:
+                        return {
+                            'status': 'error',
+                            'message': f'The MD checkpoint {checkpoint_path} holds no chunked trajectory state, it was written with another trajectory_format. Resume with the trajectory_format of the checkpointed run or start a new run with md_resume=False.'
+                        }
+                    if not os.path.isfile(os.path.join(trajectory_path, TRAJECTORY_INDEX)) or read_index(trajectory_path)['n_frames'] < int(checkpoint['trajectory_n_frames']):
+                        return {
+                            'status': 'error',
+                            'message': f'The chunked trajectory {trajectory_path} is missing frames recorded in the MD checkpoint {checkpoint_path}. Start a new run with md_resume=False.'
+                        }
+                n_frames = int(checkpoint['nsteps']) // 10 + 1
+                truncate_md_log(logfile, n_frames)
+                if trajectory_format == 'traj':
+                    truncate_traj(trajectory_path, n_frames)
+
             atoms = read(poscar_path, format='vasp')
             atoms.calc = calc
-            MaxwellBoltzmannDistribution(atoms, temperature_K=temperature)
-            Stationary(atoms)
+            if not resume:
+                MaxwellBoltzmannDistribution(atoms, temperature_K=temperature)
+                Stationary(atoms)
             dyn = NoseHooverChainNVT(
                 atoms=atoms,
                 timestep=md_timestep * units.fs,
                 temperature_K=temperature,
                 tdamp=100 * md_timestep * units.fs,
-                trajectory=f'{task_dir}/masgent_mlps_md.traj',
+                trajectory=trajectory_path if trajectory_format == 'traj' else None,
                 loginterval=10,
-                append_trajectory=False,
+                append_trajectory=resume,
             )
+            if resume:
+                restore_md_checkpoint(dyn, checkpoint)
+            # Chunked trajectories store the selected fields in preallocated arrays instead of full Atoms frames
+            trajectory_writer = None
+            if trajectory_format != 'traj':
+                from masgent.utils.md_trajectory import ChunkedTrajectoryWriter
+                trajectory_writer = ChunkedTrajectoryWriter(trajectory_path, atoms, dyn=dyn, fields=trajectory_fields, dtype=trajectory_precision, compress=trajectory_format == 'npz', append=resume)
+                # The frames of the partial chunk at the checkpoint are put back into the writer and not read from disk
+                if resume:
+                    trajectory_writer.set_state(checkpoint)
+                dyn.attach(trajectory_writer, interval=10)
             dyn.attach(MDLogger(
                 dyn=dyn,
                 atoms=atoms,
-                logfile=f'{task_dir}/masgent_mlps_md.log',
-                header=True,
+                logfile=logfile,
+                header=not resume,
                 peratom=True,
-                mode='w',
+                mode='a' if resume else 'w',
             ), interval=10)
-            dyn.run(md_steps)
-            parse_and_plot_md_log(f'{task_dir}/masgent_mlps_md.log', mlps_type, task_dir)
-            return {
+            # MSD, temperature and energy statistics and RDF are accumulated during the run, the unwrapping needs every step
+            observables = None
+            if md_observables:
+                from masgent.utils.md_observables import MDObservables
+                observables = MDObservables(dyn, sample_interval=10, rdf_rmax=rdf_rmax)
+                if resume and 'observables_unwrapped' in checkpoint:
+                    observables.set_state(checkpoint)
+                dyn.attach(observables, interval=1)
+            # The checkpoint observer comes last, so that it always follows the trajectory, log and observables of its step
+            checkpointer = MDCheckpoint(checkpoint_path, dyn, trajectory_writer=trajectory_writer, observables=observables)
+            dyn.attach(checkpointer, interval=checkpoint_interval)
+            # md_steps is the total length of the run, resuming with a larger value extends it
+            if md_steps > dyn.nsteps:
+                dyn.run(md_steps - dyn.nsteps)
+            # The final checkpoint keeps the partial chunk, so that extending the run continues it instead of starting a new shard
+            checkpointer.save()
+            if trajectory_writer is not None:
+                trajectory_writer.close()
+            parse_and_plot_md_log(logfile, mlps_type, task_dir)
+            observables_results = {}
+            if observables is not None:
+                summary = observables.write(f'{task_dir}/md_observables.json', f'{task_dir}/md_msd.csv', f'{task_dir}/md_rdf.csv' if rdf_rmax else None)
+                observables_results = {
+                    'md_observables_path': f'{task_dir}/md_observables.json',
+                    'md_msd_csv_path': f'{task_dir}/md_msd.csv',
+                    'mean_temperature (K)': round(summary['temperature (K)']['mean'], 2),
+                    'total_energy_drift (eV/atom/ps)': summary['total_energy (eV/atom)']['drift_per_ps'],
+                    'diffusion_coefficient (cm²/s)': summary['diffusion_coefficient (cm²/s)'],
+                }
+                if rdf_rmax:
+                    observables_results['md_rdf_csv_path'] = f'{task_dir}/md_rdf.csv'
+            return with_throughput({
                 'status': 'success',
-                'message': f'Completed MD simulation using {mlps_type} in {mlps_simulation_dir}.',
+                'message': f'Completed MD simulation using {mlps_type} in {mlps_simulation_dir}' + (f', resumed from step {int(checkpoint["nsteps"])}.' if resume else '.'),
                 'mlps_simulation_dir': mlps_simulation_dir,
-                'md_trajectory_path': f'{task_dir}/masgent_mlps_md.traj',
-                'md_log_path': f'{task_dir}/masgent_mlps_md.log',
+                'md_trajectory_path': trajectory_path,
+                'md_log_path': logfile,
+                'md_checkpoint_path': checkpoint_path,
                 'md_log_png_path': f'{task_dir}/md_log.png',
-            }
+                **observables_results,
+            })
         else:
             return {
                 'status': 'error',
@@ -2458,6 +2738,110 @@ def run_simulation_using_mlps(
             'message': f'Simulation using MLPs failed: {str(e)}'
         }
 
+    finally:
+        if previous_threads is not None:
+            restore_threads(previous_threads)
+
+@with_metadata(schemas.ToolMetadata(
+    name='Screen structures using machine learning potentials (MLPs)',
+    description='Screen every structure in a directory tree or glob pattern with one machine learning potential (MLP), appending energies, volumes, forces and steps to a table that can be resumed.',
+    requires=['input_path'],
+    optional=['mlps_type', 'task_type', 'fmax', 'max_steps', 'relax_cell', 'resume', 'output_format'],
+    defaults={
+        'mlps_type': 'CHGNet',
+        'task_type': 'relax',
+        'fmax': 0.1,
+        'max_steps': 500,
+        'relax_cell': False,
+        'resume': True,
+        'output_format': 'csv',
+        },
+    prereqs=[],
+))
+def screen_structures_using_mlps(
+    input_path: str,
+    mlps_type: Literal['SevenNet', 'CHGNet', 'Orb-v3', 'MatterSim'] = 'CHGNet',
+    task_type: Literal['single', 'relax'] = 'relax',
+    fmax: float = 0.1,
+    max_steps: int = 500,
+    relax_cell: bool = False,
+    resume: bool = True,
+    output_format: Literal['csv', 'parquet'] = 'csv',
+) -> dict:
+    '''
+    Screen every structure (POSCAR, CONTCAR, .vasp or .extxyz frames) in a directory tree or glob pattern using machine learning potentials (MLPs).
+    Results are appended to the screening table one structure at a time, and structures already in the table are skipped when resuming.
+    '''
+    try:
+        schemas.ScreenStructuresUsingMlps(
+            input_path=input_path,
+            mlps_type=mlps_type,
+            task_type=task_type,
+            fmax=fmax,
+            max_steps=max_steps,
+            relax_cell=relax_cell,
+            resume=resume,
+            output_format=output_format,
+        )
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': f'Invalid input parameters: {str(e)}'
+        }
+
+    try:
+        runs_dir = os.environ.get('MASGENT_SESSION_RUNS_DIR')
+
+        screening_dir = os.path.join(runs_dir, f'mlps_screening/{mlps_type}')
+        os.makedirs(screening_dir, exist_ok=True)
+
+        from masgent.utils.mlps import get_calculator, find_structures, screen_structures
+        # The screening archive itself is never screened, even if the input directory contains it
+        screening_archive_path = os.path.join(screening_dir, 'mlps_screening.extxyz')
+        paths = [path for path in find_structures(input_path) if os.path.abspath(path) != os.path.abspath(screening_archive_path)]
+        if not paths:
+            return {
+                'status': 'error',
+                'message': f'No structure files found in {input_path}.'
+            }
+
+        # One warm calculator is shared by all the structures of the screening
+        calc = get_calculator(mlps_type)
+        screening_csv_path = os.path.join(screening_dir, 'mlps_screening.csv')
+        n_screened, n_skipped, n_failed = screen_structures(
+            paths,
+            calc,
+            screening_csv_path,
+            task_type=task_type,
+            fmax=fmax,
+            max_steps=max_steps,
+            relax_cell=relax_cell,
+            resume=resume,
+            archive_path=screening_archive_path,
+            logfile=os.path.join(screening_dir, 'masgent_mlps_screening.log'),
+        )
+
+        result = {
+            'status': 'success',
+            'message': f'Screened {n_screened} structure(s) using {mlps_type} in {screening_dir}, skipped {n_skipped} already screened and {n_failed} failed.',
+            'screening_csv_path': screening_csv_path,
+            'screening_archive_path': screening_archive_path,
+        }
+
+        # The CSV stays the incremental table used for resuming, the Parquet table is exported from it
+        if output_format == 'parquet':
+            screening_parquet_path = os.path.join(screening_dir, 'mlps_screening.parquet')
+            pd.read_csv(screening_csv_path).to_parquet(screening_parquet_path, index=False)
+            result['screening_parquet_path'] = screening_parquet_path
+
+        return result
+
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': f'Screening using MLPs failed: {str(e)}'
+        }
+
 @with_metadata(schemas.ToolMetadata(
     name='Analyze features for machine learning',
     description='Analyze features (correlation matrix) for machine learning based on given input and output datasets',
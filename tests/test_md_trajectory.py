@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from ase.build import bulk
+from ase.calculators.emt import EMT
+
+from masgent.utils.md_trajectory import ChunkedTrajectoryWriter, ChunkedTrajectoryReader
+
+def make_writer(directory, n_frames, chunk_size=5):
+    atoms = bulk('Cu', 'fcc', a=3.6, cubic=True)
+    atoms.calc = EMT()
+    writer = ChunkedTrajectoryWriter(str(directory), atoms, chunk_size=chunk_size)
+    for i in range(n_frames):
+        atoms.positions[0, 0] = i
+        writer.write(step=i)
+    writer.flush()
+    return writer
+
+def test_truncate_past_the_end_keeps_written_frames(tmp_path):
+    writer = make_writer(tmp_path, 7)
+    with pytest.raises(ValueError):
+        writer.truncate(20)
+
+    reader = ChunkedTrajectoryReader(str(tmp_path))
+    assert len(reader) == 7
+    assert np.array_equal(reader.read('step'), np.arange(7))
+    assert np.array_equal(reader.read('positions')[:, 0, 0], np.arange(7))
+
+def test_truncate_without_shards_claims_no_frames(tmp_path):
+    writer = make_writer(tmp_path, 0)
+    with pytest.raises(ValueError):
+        writer.truncate(10)
+
+    reader = ChunkedTrajectoryReader(str(tmp_path))
+    assert len(reader) == 0
+    assert len(reader.read('positions')) == 0